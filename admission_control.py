@@ -0,0 +1,181 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from config_loader import load_config
+
+# Admission control for the chat endpoint.
+# Two layers: token buckets per user (JWT `sub`) and per session that cap the
+# sustained message rate, and a global in-flight cap with a bounded wait queue
+# so a burst queues briefly instead of multiplying upstream Azure calls.
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; `retry_after` is in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class TokenBucket:
+    rate: float  # tokens per second
+    capacity: float
+    tokens: float = 0.0
+    updated: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        self.tokens = self.capacity
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: Optional[float] = None) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def try_take(self, now: Optional[float] = None) -> float:
+        """Take one token. Returns 0 on success, else seconds until one is available."""
+        wait = self.wait_time(now)
+        if not wait:
+            self.tokens -= 1
+        return wait
+
+
+# Least recently used first, so the oldest entry is evicted when over max_tracked_buckets
+_user_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+_session_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+_metrics = {
+    'admitted': 0,
+    'queued': 0,
+    'shed_rate_limited': 0,
+    'shed_queue_full': 0,
+    'shed_queue_timeout': 0,
+}
+_in_flight = 0
+_waiting = 0
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _settings() -> dict:
+    cfg = load_config().get('admission', {})
+    per_user = dict(cfg.get('per_user', {}))
+    env_rate = os.getenv('RATE_LIMIT_PER_MINUTE')
+    if env_rate:
+        per_user['rate_per_minute'] = int(env_rate)
+    return {
+        'per_user': per_user,
+        'per_session': cfg.get('per_session', {}),
+        'max_in_flight': cfg.get('max_in_flight', 32),
+        'max_queue': cfg.get('max_queue', 64),
+        'queue_timeout_seconds': cfg.get('queue_timeout_seconds', 5),
+        'max_tracked_buckets': cfg.get('max_tracked_buckets', 10000),
+    }
+
+
+def _get_slots(max_in_flight: int) -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(max_in_flight)
+    return _slots
+
+
+def _bucket(
+    buckets: "OrderedDict[str, TokenBucket]", key: str, limits: dict, max_tracked: int
+) -> Optional[TokenBucket]:
+    rate_per_minute = limits.get('rate_per_minute')
+    if not rate_per_minute:
+        return None
+    bucket = buckets.get(key)
+    if bucket is None:
+        bucket = TokenBucket(rate=rate_per_minute / 60.0, capacity=limits.get('burst', rate_per_minute))
+        buckets[key] = bucket
+        while len(buckets) > max_tracked:
+            buckets.popitem(last=False)
+    else:
+        buckets.move_to_end(key)
+    return bucket
+
+
+def check_rate(user_id: str, session_id: str):
+    """Charge one message to the user's and the session's bucket or raise AdmissionRejected.
+
+    Both buckets are checked before either is charged, so a message shed by
+    one limit does not use up the other.
+    """
+    settings = _settings()
+    now = time.monotonic()
+    max_tracked = settings['max_tracked_buckets']
+    buckets = [
+        bucket for bucket in (
+            _bucket(_user_buckets, user_id, settings['per_user'], max_tracked),
+            _bucket(_session_buckets, session_id, settings['per_session'], max_tracked),
+        ) if bucket is not None
+    ]
+    wait = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+    if wait:
+        _metrics['shed_rate_limited'] += 1
+        raise AdmissionRejected('rate_limited', math.ceil(wait))
+    for bucket in buckets:
+        bucket.try_take(now)
+
+
+@asynccontextmanager
+async def admission_slot():
+    """Hold a global in-flight slot for the duration of a chat turn.
+
+    Raises AdmissionRejected immediately when the wait queue is full, and
+    after `queue_timeout_seconds` of queueing. Callers that serialize turns
+    per session take the session lock first, so a turn waiting behind its own
+    session never holds a global slot.
+    """
+    global _in_flight, _waiting
+    settings = _settings()
+    slots = _get_slots(settings['max_in_flight'])
+    if slots.locked():
+        if _waiting >= settings['max_queue']:
+            _metrics['shed_queue_full'] += 1
+            raise AdmissionRejected('queue_full', 1)
+        _metrics['queued'] += 1
+        _waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), settings['queue_timeout_seconds'])
+        except asyncio.TimeoutError:
+            _metrics['shed_queue_timeout'] += 1
+            raise AdmissionRejected('queue_timeout', 1)
+        finally:
+            _waiting -= 1
+    else:
+        await slots.acquire()
+    _metrics['admitted'] += 1
+    _in_flight += 1
+    try:
+        yield
+    finally:
+        _in_flight -= 1
+        slots.release()
+
+
+def get_admission_metrics() -> dict:
+    return {
+        **_metrics,
+        'in_flight': _in_flight,
+        'waiting': _waiting,
+        'tracked_users': len(_user_buckets),
+        'tracked_sessions': len(_session_buckets),
+    }
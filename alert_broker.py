@@ -0,0 +1,92 @@
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Set
+from config_loader import load_config
+
+# In-process fan-out of escalation alerts to live moderator subscribers.
+# publish() never awaits: each subscriber has a bounded queue, and one that
+# falls behind is marked overflowed and cut off once its queue drains. It
+# then reconnects with its last event id and catches up from the replay
+# buffer, so a slow dashboard never slows the chat path.
+
+
+def stream_settings() -> dict:
+    cfg = load_config().get('escalation', {}).get('stream', {})
+    return {
+        'subscriber_queue_size': cfg.get('subscriber_queue_size', 100),
+        'replay_buffer': cfg.get('replay_buffer', 1000),
+        'keepalive_seconds': cfg.get('keepalive_seconds', 15),
+    }
+
+
+@dataclass(eq=False)
+class Subscription:
+    kinds: Optional[Set[str]] = None
+    session_id: Optional[str] = None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(stream_settings()['subscriber_queue_size']))
+    overflowed: bool = False
+
+    def matches(self, alert: Dict) -> bool:
+        if self.kinds and alert['kind'] not in self.kinds:
+            return False
+        if self.session_id and alert['session_id'] != self.session_id:
+            return False
+        return True
+
+
+_subscribers: Set[Subscription] = set()
+_replay: Deque[Dict] = deque(maxlen=stream_settings()['replay_buffer'])
+_stats = {'published': 0, 'delivered': 0, 'overflowed_subscribers': 0}
+_first_id: Optional[int] = None  # first and newest alert id published by this process
+_last_id: Optional[int] = None
+
+
+def publish(alert: Dict):
+    """Fan an alert (with a monotonically increasing 'id') out to matching subscribers."""
+    global _first_id, _last_id
+    if _first_id is None:
+        _first_id = alert['id']
+    _last_id = alert['id']
+    _replay.append(alert)
+    _stats['published'] += 1
+    for sub in _subscribers:
+        if sub.overflowed or not sub.matches(alert):
+            continue
+        try:
+            sub.queue.put_nowait(alert)
+            _stats['delivered'] += 1
+        except asyncio.QueueFull:
+            sub.overflowed = True
+            _stats['overflowed_subscribers'] += 1
+
+
+def subscribe(kinds: Optional[Set[str]] = None, session_id: Optional[str] = None) -> Subscription:
+    sub = Subscription(kinds=kinds or None, session_id=session_id)
+    _subscribers.add(sub)
+    return sub
+
+
+def unsubscribe(sub: Subscription):
+    _subscribers.discard(sub)
+
+
+def resume_point(last_event_id: int) -> int:
+    """The id to resume after for a reconnecting client.
+
+    A Last-Event-ID from another boot, or ahead of the newest alert, is
+    ignored (0), so everything buffered is replayed instead of new alerts
+    being skipped until the ids catch up.
+    """
+    if _first_id is None or not _first_id <= last_event_id <= _last_id:
+        return 0
+    return last_event_id
+
+
+def replay_since(sub: Subscription, last_event_id: int) -> List[Dict]:
+    """Buffered alerts after `last_event_id` that match the subscription's filters."""
+    return [a for a in _replay if a['id'] > last_event_id and sub.matches(a)]
+
+
+def broker_stats() -> Dict:
+    return {**_stats, 'subscribers': len(_subscribers), 'replay_buffered': len(_replay)}
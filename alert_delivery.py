@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import smtplib
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Deque, Dict, List, Optional
+import aiohttp
+from config_loader import load_config
+
+# Background delivery of escalation alerts to external sinks.
+# trigger_alert only appends to a bounded deque and sets an event, O(1) and
+# non-blocking. The worker coroutine drains the deque in batches and sends each
+# batch to every configured sink, retrying with exponential backoff and jitter.
+# Blocking sinks (file, SMTP) run in worker threads. When the queue is full,
+# new alerts are dropped and counted rather than slowing the chat path.
+
+logger = logging.getLogger(__name__)
+
+
+def delivery_settings() -> dict:
+    cfg = load_config().get('escalation', {}).get('delivery', {})
+    return {
+        'queue_size': cfg.get('queue_size', 10000),
+        'batch_size': cfg.get('batch_size', 50),
+        'flush_interval_seconds': cfg.get('flush_interval_seconds', 1.0),
+        'max_retries': cfg.get('max_retries', 5),
+        'backoff_base_seconds': cfg.get('backoff_base_seconds', 0.5),
+        'backoff_max_seconds': cfg.get('backoff_max_seconds', 30),
+        'shutdown_flush_seconds': cfg.get('shutdown_flush_seconds', 10),
+        'sinks': list(cfg.get('sinks') or []),
+    }
+
+
+class WebhookSink:
+    def __init__(self, url: str, timeout_seconds: float = 10):
+        self.name = 'webhook'
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout_seconds)
+
+    async def send(self, batch: List[Dict]):
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            async with session.post(self.url, json={'alerts': batch}) as response:
+                if response.status >= 400:
+                    raise RuntimeError(f'webhook returned {response.status}')
+
+
+class FileSink:
+    def __init__(self, path: str):
+        self.name = 'file'
+        self.path = path
+
+    def _write(self, batch: List[Dict]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(alert, default=str) + '\n' for alert in batch)
+
+    async def send(self, batch: List[Dict]):
+        await asyncio.to_thread(self._write, batch)
+
+
+class SmtpSink:
+    def __init__(self, host: str, port: int, sender: str, recipients: List[str], username: str = '', password: str = '', starttls: bool = True):
+        self.name = 'smtp'
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = recipients
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+
+    def _send(self, batch: List[Dict]):
+        msg = EmailMessage()
+        kinds = sorted({a['kind'] for a in batch})
+        msg['Subject'] = f"[Safety alert] {len(batch)} alert(s): {', '.join(kinds)}"
+        msg['From'] = self.sender
+        msg['To'] = ', '.join(self.recipients)
+        msg.set_content('\n'.join(json.dumps(a, default=str, indent=2) for a in batch))
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(msg)
+
+    async def send(self, batch: List[Dict]):
+        await asyncio.to_thread(self._send, batch)
+
+
+def build_sinks(sink_cfgs: List[dict]) -> list:
+    sinks = []
+    for cfg in sink_cfgs:
+        kind = cfg.get('type')
+        if kind == 'webhook':
+            sinks.append(WebhookSink(cfg['url'], cfg.get('timeout_seconds', 10)))
+        elif kind == 'file':
+            sinks.append(FileSink(cfg['path']))
+        elif kind == 'smtp':
+            sinks.append(SmtpSink(
+                host=cfg['host'],
+                port=cfg.get('port', 587),
+                sender=cfg['sender'],
+                recipients=cfg['recipients'],
+                username=cfg.get('username', ''),
+                password=os.getenv('ALERT_SMTP_PASSWORD', ''),
+                starttls=cfg.get('starttls', True)
+            ))
+        else:
+            raise ValueError(f"Unknown alert sink type: {kind}")
+    return sinks
+
+
+class AlertDispatcher:
+    def __init__(self, sinks: list, queue_size: int = 10000, batch_size: int = 50, flush_interval_seconds: float = 1.0,
+                 max_retries: int = 5, backoff_base_seconds: float = 0.5, backoff_max_seconds: float = 30):
+        self.sinks = sinks
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self._queue: Deque[Dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._started = time.monotonic()
+        self.stats = {'enqueued': 0, 'dropped': 0, 'batches': 0, 'delivered': 0, 'retries': 0, 'failed_batches': 0}
+
+    def enqueue(self, alert: Dict):
+        if len(self._queue) >= self.queue_size:
+            self.stats['dropped'] += 1
+            return
+        self._queue.append(alert)
+        self.stats['enqueued'] += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _send_with_retry(self, sink, batch: List[Dict]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await sink.send(batch)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("alert_delivery_failed", extra={"fields": {"sink": sink.name, "alerts": len(batch), "error": str(e)}})
+                    return False
+                self.stats['retries'] += 1
+                delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        return False
+
+    async def flush(self):
+        """Deliver everything queued right now, batch by batch."""
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            results = await asyncio.gather(*(self._send_with_retry(sink, batch) for sink in self.sinks))
+            self.stats['batches'] += 1
+            if all(results):
+                self.stats['delivered'] += len(batch)
+            else:
+                self.stats['failed_batches'] += 1
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if len(self._queue) < self.batch_size:
+                # Linger so alerts arriving together go out as one batch
+                await asyncio.sleep(self.flush_interval_seconds)
+            await self.flush()
+
+    def snapshot(self) -> Dict:
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        return {
+            **self.stats,
+            'queue_depth': len(self._queue),
+            'sinks': [s.name for s in self.sinks],
+            'delivered_per_second': round(self.stats['delivered'] / elapsed, 3),
+        }
+
+
+_dispatcher: Optional[AlertDispatcher] = None
+
+
+def configure_delivery() -> Optional[AlertDispatcher]:
+    """Build the dispatcher from config (plus ALERT_WEBHOOK_URL); None when no sinks are set."""
+    global _dispatcher
+    settings = delivery_settings()
+    sink_cfgs = settings.pop('sinks')
+    settings.pop('shutdown_flush_seconds')
+    if os.getenv('ALERT_WEBHOOK_URL'):
+        sink_cfgs.append({'type': 'webhook', 'url': os.getenv('ALERT_WEBHOOK_URL')})
+    if not sink_cfgs:
+        return None
+    _dispatcher = AlertDispatcher(build_sinks(sink_cfgs), **settings)
+    return _dispatcher
+
+
+def enqueue_alert(alert: Dict):
+    if _dispatcher is not None:
+        _dispatcher.enqueue(alert)
+
+
+async def flush_delivery():
+    """Deliver what is still queued at shutdown, for at most `shutdown_flush_seconds`."""
+    if _dispatcher is None:
+        return
+    try:
+        await asyncio.wait_for(_dispatcher.flush(), delivery_settings()['shutdown_flush_seconds'])
+    except asyncio.TimeoutError:
+        logger.error("alert_delivery_shutdown_timeout", extra={"fields": {"undelivered": len(_dispatcher._queue)}})
+
+
+def delivery_stats() -> Optional[Dict]:
+    return _dispatcher.snapshot() if _dispatcher is not None else None
@@ -1,25 +1,46 @@
+import logging
 import os
-from fastapi import FastAPI, HTTPException, Header
+import time
+from fastapi import FastAPI, HTTPException, Header, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from pydantic import Field
-from openai_client import get_llm_response
+from openai_client import get_llm_response, stream_llm_response, router as model_router, LLM_FAILURE_MESSAGES
 from content_safety import is_content_safe
 from prompt_shield import is_prompt_safe_from_jailbreak
-from interaction_store import add_interaction, get_recent_interactions
+from jailbreak_index import index as jailbreak_index
+from interaction_store import add_interaction, get_recent_interactions, store_stats, flush_journal
 from risk_assessor import assess_risk
+from risk_index import record_risk, top_sessions, tracked_sessions
 from escalation_service import trigger_alert, list_alerts
+from alert_delivery import configure_delivery, delivery_stats, flush_delivery
+from alert_broker import subscribe, unsubscribe, replay_since, resume_point, broker_stats, stream_settings
 from ai_literacy_snippets import get_snippet
 from language_filter import cleanse_output
+from text_normalizer import normalize_text
 from retention_job import retention_loop
+from transcript_export import iter_records, ndjson_chunks
 import asyncio
+import json
+import re
 import uuid
 from safety_messaging import get_content_safety_message, get_jailbreak_message, get_anthropomorphism_explanation
 from auth import router as auth_router
-from auth_utils import decode_token
+from auth_utils import decode_token, is_admin
+from structured_logging import setup_logging, shutdown_logging, request_id_var, logging_stats
+from loop_monitor import lag_monitor_loop, lag_stats, recent_stalls, sample_profile, diagnostics_settings
+from admission_control import check_rate, admission_slot, AdmissionRejected, get_admission_metrics
+from session_locks import session_lock, lock_stats
+from moderation_stats import record as record_stat, moderation_rollups
+from token_revocation import is_revoked, revocation_sync_loop, revocation_stats
+from idempotency_cache import run_once, request_fingerprint, IdempotencyConflict, idempotency_settings, idempotency_stats
+from ws_connections import ChatConnection, SlowConsumer, register, unregister, connection_count, heartbeat_loop, ws_settings
 
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 def validate_environment():
     """Validate that all required environment variables are set."""
@@ -40,7 +61,7 @@ def validate_environment():
     if missing_vars:
         raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
     
-    print("✅ All required environment variables are configured")
+    logger.info("environment_validated")
 
 validate_environment()
 
@@ -60,15 +81,47 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
-from typing import Optional
+from typing import Awaitable, Callable, Optional
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Correlate every log line of a request; honours an incoming X-Request-ID."""
+    request_id = request.headers.get('x-request-id') or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers['X-Request-ID'] = request_id
+    return response
+
+EmitFn = Callable[[dict], Awaitable[None]]
 
 class ChatMessage(BaseModel):
     message: str
     age: Optional[int] = Field(None, ge=1, le=120, description="Declared user age for safety adaptation")
     session_id: Optional[str] = Field(None, description="Client-provided session identifier")
 
+MIN_AGE = 8
+AGE_GATE_MESSAGE = "⚠️ This chatbot is not available for very young users."
+
+
+def _age_band_for(declared_age: int) -> str:
+    if declared_age <= 12:
+        return 'child'
+    elif declared_age <= 17:
+        return 'teen'
+    return 'adult'
+
+
 @app.post("/api/chat")
-async def chat(message: ChatMessage, x_session_id: Optional[str] = Header(default=None), authorization: Optional[str] = Header(default=None)):
+async def chat(
+    message: ChatMessage,
+    response: Response,
+    x_session_id: Optional[str] = Header(default=None),
+    authorization: Optional[str] = Header(default=None),
+    idempotency_key: Optional[str] = Header(default=None)
+):
     if not message.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
 
@@ -81,54 +134,147 @@ async def chat(message: ChatMessage, x_session_id: Optional[str] = Header(defaul
         raise HTTPException(status_code=401, detail='Invalid token')
 
     declared_age = message.age or payload.get('age') or 18
-    if declared_age < 8:
-        return {"response": "⚠️ This chatbot is not available for very young users.", "age_gate": True}
+    if declared_age < MIN_AGE:
+        return {"response": AGE_GATE_MESSAGE, "age_gate": True}
 
     # Determine session id
-    session_id = message.session_id or x_session_id or str(uuid.uuid4())
+    client_session_id = message.session_id or x_session_id
+    session_id = client_session_id or str(uuid.uuid4())
 
     # Determine age band first (needed for safety messaging)
-    if declared_age <= 12:
-        age_band = 'child'
-    elif declared_age <= 17:
-        age_band = 'teen'
-    else:
-        age_band = 'adult'
+    age_band = _age_band_for(declared_age)
+    normalized = normalize_text(message.message)
+
+    async def run_turn() -> dict:
+        # Admission control: per-user/per-session rate limits, then turns of the same
+        # session run one at a time, and only the running turn holds a global in-flight slot
+        try:
+            check_rate(payload['sub'], session_id)
+            async with session_lock(session_id), admission_slot():
+                return await _run_chat_turn(message.message, session_id, age_band, normalized=normalized)
+        except AdmissionRejected as e:
+            raise HTTPException(
+                status_code=429,
+                detail='Too many requests, please slow down',
+                headers={'Retry-After': str(e.retry_after)}
+            )
+
+    if not idempotency_key:
+        return await run_turn()
+
+    # Retries with the same Idempotency-Key join the in-flight turn or get the stored response
+    if len(idempotency_key) > idempotency_settings()['max_key_length']:
+        raise HTTPException(status_code=400, detail='Idempotency-Key too long')
+    fingerprint = request_fingerprint(normalized, client_session_id or '', age_band)
+    try:
+        result, replayed = await run_once(
+            payload['sub'], idempotency_key, fingerprint, run_turn,
+            should_store=lambda turn: not turn.get('llm_error')
+        )
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail='Idempotency-Key was already used for a different request')
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return result
+
+
+async def _run_chat_turn(
+    user_message: str,
+    session_id: str,
+    age_band: str,
+    emit: Optional[EmitFn] = None,
+    normalized: Optional[str] = None
+) -> dict:
+    """Moderation pipeline and LLM call for one admitted chat turn.
+
+    When `emit` is given (WebSocket transport) moderation events and the
+    cleansed response are pushed through it as they happen.
+    """
+    turn_started = time.perf_counter()
+    stage_started = turn_started
+
+    def log_stage(stage: str, **fields):
+        nonlocal stage_started
+        now = time.perf_counter()
+        logger.info("chat_stage", extra={"fields": {
+            "stage": stage, "session_id": session_id, "ms": round((now - stage_started) * 1000, 1), **fields
+        }})
+        stage_started = now
+
+    def log_completed(outcome: str):
+        logger.info("chat_completed", extra={"fields": {
+            "outcome": outcome, "session_id": session_id, "age_band": age_band,
+            "ms": round((time.perf_counter() - turn_started) * 1000, 1)
+        }})
+
+    # Canonical form computed once and reused by every matcher and cache key
+    if normalized is None:
+        normalized = normalize_text(user_message)
+    record_stat('messages', age_band)
 
     # Content Safety check (structured)
-    safety_result = await is_content_safe(message.message)
+    safety_result = await is_content_safe(user_message)
     categories = safety_result.get('categories', {})
-    add_interaction(session_id, 'user', message.message, categories=categories)
+    log_stage("content_safety", allowed=bool(safety_result.get('allowed')))
+    add_interaction(session_id, 'user', user_message, categories=categories, normalized=normalized)
     if not safety_result.get('allowed'):
+        # Blocked categories still count towards the session's risk for moderators
+        record_risk(session_id, assess_risk(session_id))
         safety_message = get_content_safety_message(age_band, categories)
+        moderation_explain = {
+            "reason": "content_safety_block",
+            "categories": categories,
+            "age_band": age_band
+        }
+        blocked_category = max(categories, key=categories.get) if any(categories.values()) else 'unknown'
+        record_stat('blocks', 'content_safety', age_band, blocked_category)
+        if emit:
+            await emit({"type": "moderation", **moderation_explain})
+        log_completed("content_safety_block")
         return {
             "response": safety_message,
-            "moderation_explain": {
-                "reason": "content_safety_block",
-                "categories": categories,
-                "age_band": age_band
-            },
+            "moderation_explain": moderation_explain,
             "session_id": session_id
         }
 
     # Jailbreak Detection
-    if not await is_prompt_safe_from_jailbreak(message.message):
+    jailbreak_safe = await is_prompt_safe_from_jailbreak(user_message, normalized=normalized)
+    log_stage("jailbreak", safe=jailbreak_safe)
+    if not jailbreak_safe:
         jailbreak_message = get_jailbreak_message(age_band)
+        moderation_explain = {"reason": "jailbreak_detected", "age_band": age_band}
+        record_stat('blocks', 'jailbreak', age_band)
+        record_risk(session_id, assess_risk(session_id))
+        if emit:
+            await emit({"type": "moderation", **moderation_explain})
+        log_completed("jailbreak_block")
         return {
             "response": jailbreak_message,
-            "moderation_explain": {"reason": "jailbreak_detected", "age_band": age_band},
+            "moderation_explain": moderation_explain,
             "session_id": session_id
         }
 
     # Risk assessment (post-input)
     risk = assess_risk(session_id)
+    record_risk(session_id, risk)
     if 'self_harm_interest' in risk['flags']:
         trigger_alert('self_harm_interest', session_id, {'risk': risk})
     if risk['risk_level'] == 'high':
         trigger_alert('high_risk_pattern', session_id, {'risk': risk})
+    log_stage("risk", risk_level=risk['risk_level'], flags=risk['flags'])
+    if emit and risk['flags']:
+        await emit({"type": "moderation", "reason": "risk_flags", "risk": risk})
 
-    response_text = await get_llm_response(message.message, age_band=age_band, session_id=session_id)
-    cleaned_text, modified, anthropomorphism_explanation = cleanse_output(response_text, age_band)
+    if emit:
+        cleaned_text, modified, anthropomorphism_explanation = await _stream_cleansed_response(
+            user_message, session_id, age_band, emit
+        )
+    else:
+        response_text = await get_llm_response(user_message, age_band=age_band, session_id=session_id)
+        cleaned_text, modified, anthropomorphism_explanation = cleanse_output(response_text, age_band)
+    # Quota/LLM failures come back as stand-in replies; flag them so retries are not served this one
+    llm_error = cleaned_text in LLM_FAILURE_MESSAGES
+    log_stage("llm", streamed=emit is not None, modified=modified, llm_error=llm_error)
     
     # Add explanations for modified content
     explanation_parts = []
@@ -154,16 +300,137 @@ async def chat(message: ChatMessage, x_session_id: Optional[str] = Header(defaul
         if snippet:
             intro = get_literacy_injection_intro(age_band)
             cleaned_text += f"\n\n{intro} {snippet}"
+            record_stat('literacy_injections', age_band)
 
+    log_completed("llm_error" if llm_error else "answered")
     return {
         "response": cleaned_text,
         "age_band": age_band,
         "session_id": session_id,
         "risk": risk,
-        "literacy_injected": bool(snippet)
+        "literacy_injected": bool(snippet),
+        "llm_error": llm_error
     }
 
 
+# Split streamed text after sentence-ending punctuation so each piece can be
+# cleansed before it is sent; banned phrases never span a sentence boundary.
+_SENTENCE_END = re.compile(r'[.!?]+\s+')
+
+
+async def _stream_cleansed_response(user_message: str, session_id: str, age_band: str, emit: EmitFn) -> tuple[str, bool, str]:
+    pieces = []
+    modified = False
+    explanation = ""
+    buffer = ""
+
+    async def flush(segment: str):
+        nonlocal modified, explanation
+        cleaned, seg_modified, seg_explanation = cleanse_output(segment, age_band)
+        if seg_modified:
+            modified = True
+            explanation = seg_explanation
+        pieces.append(cleaned)
+        await emit({"type": "delta", "text": cleaned})
+
+    async for delta in stream_llm_response(user_message, age_band=age_band, session_id=session_id):
+        buffer += delta
+        last_end = None
+        for match in _SENTENCE_END.finditer(buffer):
+            last_end = match.end()
+        if last_end is not None:
+            await flush(buffer[:last_end])
+            buffer = buffer[last_end:]
+    if buffer:
+        await flush(buffer)
+    return "".join(pieces), modified, explanation
+
+
+async def _receive_frame(websocket: WebSocket) -> Optional[dict]:
+    """Next client frame if it is a JSON object; None for binary, non-JSON or non-object frames."""
+    try:
+        frame = await websocket.receive_json()
+    except (ValueError, KeyError):  # KeyError: binary frame has no text
+        return None
+    return frame if isinstance(frame, dict) else None
+
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, token: Optional[str] = None, session_id: Optional[str] = None, age: Optional[int] = None):
+    """Chat over a single authenticated connection.
+
+    Auth via `?token=` or a first `{"type": "auth", "token": ...}` frame. Then
+    `{"type": "message", "message": ...}` frames are answered with `moderation`,
+    `delta` and `done` events. The server sends `ping` and expects `pong`.
+    """
+    await websocket.accept()
+    settings = ws_settings()
+    if not token:
+        try:
+            first = await asyncio.wait_for(_receive_frame(websocket), settings['auth_timeout_seconds'])
+            token = first.get('token') if first and first.get('type') == 'auth' else None
+        except (asyncio.TimeoutError, WebSocketDisconnect):
+            token = None
+    payload = decode_token(token) if token else None
+    if not payload:
+        await websocket.send_json({"type": "error", "reason": "invalid_token"})
+        await websocket.close(code=4401)
+        return
+
+    declared_age = age or payload.get('age') or 18
+    if declared_age < MIN_AGE:
+        await websocket.send_json({"type": "error", "reason": "age_gate", "response": AGE_GATE_MESSAGE})
+        await websocket.close(code=4403)
+        return
+
+    conn = ChatConnection(
+        websocket=websocket,
+        user_id=payload['sub'],
+        session_id=session_id or str(uuid.uuid4()),
+        age_band=_age_band_for(declared_age),
+        jti=payload.get('jti')
+    )
+    register(conn)
+    try:
+        await conn.send({"type": "ready", "session_id": conn.session_id, "age_band": conn.age_band})
+        while True:
+            frame = await _receive_frame(websocket)
+            conn.touch()
+            kind = frame.get('type') if frame else None
+            if kind == 'ping':
+                await conn.send({"type": "pong"})
+                continue
+            if kind != 'message':
+                if kind != 'pong':
+                    await conn.send({"type": "error", "reason": "invalid_frame"})
+                continue
+            text = (frame.get('message') or '').strip()
+            if not text or len(text) > settings['max_message_chars']:
+                await conn.send({"type": "error", "reason": "invalid_message"})
+                continue
+            if conn.jti and is_revoked(conn.jti):
+                # Logged out since connecting
+                await conn.send({"type": "error", "reason": "invalid_token"})
+                await conn.close(code=4401)
+                break
+            conn.busy = True
+            request_id_var.set(uuid.uuid4().hex)
+            try:
+                check_rate(conn.user_id, conn.session_id)
+                async with session_lock(conn.session_id), admission_slot():
+                    result = await _run_chat_turn(text, conn.session_id, conn.age_band, emit=conn.send)
+                await conn.send({"type": "done", **result})
+            except AdmissionRejected as e:
+                await conn.send({"type": "error", "reason": e.reason, "retry_after": e.retry_after})
+            finally:
+                conn.busy = False
+    except (WebSocketDisconnect, SlowConsumer):
+        pass
+    finally:
+        unregister(conn)
+        await conn.close()
+
+
 @app.get("/api/health")
 async def health():
     """Health check endpoint to verify the app is running."""
@@ -217,6 +484,151 @@ async def create_new_session(authorization: Optional[str] = Header(default=None)
 async def get_alerts():
     return {"alerts": list_alerts()}
 
+@app.get("/api/mod/alerts/stream")
+async def stream_alerts(
+    kind: Optional[str] = None,
+    session_id: Optional[str] = None,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(default=None, alias="Last-Event-ID"),
+    authorization: Optional[str] = Header(default=None)
+):
+    """Server-Sent Events feed of escalation alerts.
+
+    `kind` is a comma-separated filter. Reconnecting clients resume after
+    `Last-Event-ID` (header or query) from the broker's replay buffer.
+    """
+    _require_admin(authorization)
+    if last_event_id is None and last_event_id_header and last_event_id_header.isdigit():
+        last_event_id = int(last_event_id_header)
+    kinds = {k.strip() for k in kind.split(',') if k.strip()} if kind else None
+    sub = subscribe(kinds=kinds, session_id=session_id)
+    keepalive = stream_settings()['keepalive_seconds']
+
+    def format_event(alert: dict) -> str:
+        return f"id: {alert['id']}\nevent: alert\ndata: {json.dumps(alert, default=str)}\n\n"
+
+    async def events():
+        try:
+            sent_up_to = 0
+            if last_event_id is not None:
+                sent_up_to = resume_point(last_event_id)
+                for alert in replay_since(sub, sent_up_to):
+                    sent_up_to = alert['id']
+                    yield format_event(alert)
+            while True:
+                if sub.overflowed and sub.queue.empty():
+                    # Fell behind; the client reconnects with Last-Event-ID to catch up
+                    break
+                try:
+                    alert = await asyncio.wait_for(sub.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if alert['id'] > sent_up_to:
+                    sent_up_to = alert['id']
+                    yield format_event(alert)
+        finally:
+            unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/mod/sessions/top")
+async def get_top_sessions(n: int = 10, authorization: Optional[str] = Header(default=None)):
+    """Highest-risk live sessions with their current flags, riskiest first."""
+    _require_admin(authorization)
+    if not 1 <= n <= 500:
+        raise HTTPException(status_code=400, detail='n must be between 1 and 500')
+    return {"sessions": top_sessions(n), "tracked": tracked_sessions()}
+
+@app.get("/api/mod/stats")
+async def get_moderation_stats(authorization: Optional[str] = Header(default=None)):
+    """Per-minute (last hour) and per-hour (last day) moderation rollups."""
+    _require_admin(authorization)
+    return moderation_rollups()
+
+@app.get("/api/mod/metrics")
+async def get_metrics(authorization: Optional[str] = Header(default=None)):
+    """Capacity and load-shedding counters for dashboards."""
+    _require_admin(authorization)
+    return {
+        "admission": get_admission_metrics(),
+        "outbound": model_router.snapshot(),
+        "websocket_connections": connection_count(),
+        "alert_stream": broker_stats(),
+        "alert_delivery": delivery_stats(),
+        "interaction_store": store_stats(),
+        "session_locks": lock_stats(),
+        "idempotency": idempotency_stats(),
+        "jailbreak_index": jailbreak_index.snapshot(),
+        "token_revocation": revocation_stats(),
+        "event_loop": lag_stats(),
+        "logging": logging_stats()
+    }
+
+
+def _require_admin(authorization: Optional[str]) -> dict:
+    if not authorization or not authorization.lower().startswith('bearer '):
+        raise HTTPException(status_code=401, detail='Not authenticated')
+    token = authorization.split()[1]
+    payload = decode_token(token)
+    if not payload:
+        raise HTTPException(status_code=401, detail='Invalid token')
+    if not is_admin(payload):
+        raise HTTPException(status_code=403, detail='Admin access required')
+    return payload
+
+@app.get("/api/admin/loop_stalls")
+async def get_loop_stalls(authorization: Optional[str] = Header(default=None)):
+    """Recent event-loop stalls with the stack that was blocking the loop."""
+    _require_admin(authorization)
+    return {"stats": lag_stats(), "stalls": recent_stalls()}
+
+@app.get("/api/admin/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = 5.0,
+    interval_ms: float = 5.0,
+    all_threads: bool = False,
+    authorization: Optional[str] = Header(default=None)
+):
+    """Sample the live process and return folded stacks for flamegraph tools."""
+    _require_admin(authorization)
+    max_seconds = diagnostics_settings()['profile_max_seconds']
+    if not 0 < seconds <= max_seconds or interval_ms < 1:
+        raise HTTPException(status_code=400, detail=f'seconds must be in (0, {max_seconds}] and interval_ms >= 1')
+    try:
+        # Sampled from a worker thread so the loop keeps serving while being profiled
+        folded = await asyncio.to_thread(sample_profile, seconds, interval_ms / 1000, not all_threads)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(folded)
+
+@app.get("/api/admin/export")
+async def export_transcripts(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    session_id: Optional[str] = None,
+    gzip: bool = False,
+    authorization: Optional[str] = Header(default=None)
+):
+    """Stream transcripts (spill journal, then live store) as NDJSON.
+
+    `since`/`until` are epoch seconds; `session_id` is a comma-separated filter.
+    """
+    _require_admin(authorization)
+    session_ids = {s.strip() for s in session_id.split(',') if s.strip()} if session_id else None
+    chunks = ndjson_chunks(iter_records(since=since, until=until, session_ids=session_ids), compress=gzip)
+    filename = 'transcripts.ndjson.gz' if gzip else 'transcripts.ndjson'
+    # A sync iterator: Starlette pulls each chunk in the threadpool, off the event loop
+    return StreamingResponse(
+        chunks,
+        media_type='application/gzip' if gzip else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/api/self_test")
 async def self_test():
     # Very lightweight diagnostics
@@ -233,6 +645,23 @@ async def self_test():
 async def startup_tasks():
     # Launch retention loop in background
     asyncio.create_task(retention_loop())
+    # Shared heartbeat for all /ws/chat connections
+    asyncio.create_task(heartbeat_loop())
+    # Event-loop stall detection
+    asyncio.create_task(lag_monitor_loop())
+    # Batched delivery of escalation alerts to external sinks, if any are configured
+    dispatcher = configure_delivery()
+    if dispatcher:
+        asyncio.create_task(dispatcher.run())
+    # Pull logouts made on other workers when token_revocation.shared is on
+    asyncio.create_task(revocation_sync_loop())
+@app.on_event("shutdown")
+async def shutdown_tasks():
+    # Queued alerts (self-harm pages included) would otherwise be lost on every deploy
+    await flush_delivery()
+    flush_journal()
+    shutdown_logging()
+
 if __name__ == "__main__":
     import uvicorn
     host = os.getenv('HOST', '0.0.0.0')
@@ -3,7 +3,8 @@ from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from database import get_db, Base, engine
 from models import User
-from auth_utils import hash_password, verify_password, create_token, decode_token
+from auth_utils import hash_password, verify_password, create_token, decode_token, is_admin_username
+from token_revocation import revoke
 from typing import Optional
 
 # Ensure tables
@@ -32,6 +33,9 @@ def get_current_user(token: Optional[str]) -> Optional[dict]:
 
 @router.post('/register', response_model=TokenResp)
 def register(data: RegisterReq, db: Session = Depends(get_db)):
+    # Admin rights follow the username, so a listed name that is not (or no longer) registered must not be claimable
+    if is_admin_username(data.username):
+        raise HTTPException(status_code=403, detail="Username is reserved")
     existing = db.query(User).filter(User.username == data.username).first()
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
@@ -74,8 +78,9 @@ def logout(authorization: Optional[str] = Header(default=None)):
     if not payload:
         raise HTTPException(status_code=401, detail='Invalid token')
     
-    # For now, we just confirm the token is valid
-    # In a production system, you might add the token to a blacklist
+    # Revoked until it would have expired anyway; decode_token rejects it from now on
+    if 'jti' in payload:
+        revoke(payload['jti'], payload['exp'])
     return {
         'message': 'Successfully logged out',
         'username': payload['username']
@@ -1,4 +1,5 @@
 import os
+import uuid
 import datetime as dt
 import jwt
 try:
@@ -6,11 +7,13 @@ try:
 except ImportError as e:
     raise ImportError("passlib is required. Ensure 'pip install passlib bcrypt' succeeded.") from e
 from typing import Optional
+from token_revocation import is_revoked
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 JWT_SECRET = os.getenv('JWT_SECRET', 'dev-secret-change')
 JWT_ALG = 'HS256'
 JWT_EXPIRE_MINUTES = int(os.getenv('JWT_EXPIRE_MINUTES', '60'))
+ADMIN_USERNAMES = {u.strip() for u in os.getenv('ADMIN_USERNAMES', '').split(',') if u.strip()}
 
 
 def hash_password(password: str) -> str:
@@ -28,6 +31,7 @@ def create_token(user_id: int, username: str, age: int | None) -> str:
         'username': username,
         'age': age,
         'iat': now,
+        'jti': uuid.uuid4().hex,
         'exp': now + dt.timedelta(minutes=JWT_EXPIRE_MINUTES)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
@@ -35,6 +39,18 @@ def create_token(user_id: int, username: str, age: int | None) -> str:
 
 def decode_token(token: str) -> Optional[dict]:
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
     except jwt.PyJWTError:
         return None
+    if 'jti' in payload and is_revoked(payload['jti']):
+        return None
+    return payload
+
+
+def is_admin(payload: dict) -> bool:
+    return payload.get('username') in ADMIN_USERNAMES
+
+
+def is_admin_username(username: str) -> bool:
+    """Listed admin names, in any case; open registration must never hand them out."""
+    return username.casefold() in {name.casefold() for name in ADMIN_USERNAMES}
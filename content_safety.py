@@ -1,3 +1,4 @@
+import logging
 import os
 from azure.ai.contentsafety.aio import ContentSafetyClient
 from azure.core.credentials import AzureKeyCredential
@@ -7,6 +8,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 async def is_content_safe(text: str):
     key = os.environ["AZURE_CONTENT_SAFETY_KEY"]
     endpoint = os.environ["AZURE_CONTENT_SAFETY_ENDPOINT"]
@@ -56,8 +59,8 @@ async def is_content_safe(text: str):
             }
                 
         except HttpResponseError as e:
-            print(f"Content Safety API error: {str(e)}")
+            logger.error("content_safety_api_error", extra={"fields": {"error": str(e)}})
             return {'allowed': False, 'categories': {}}
-        except Exception as e:
-            print(f"Unexpected error in content safety check: {str(e)}")
+        except Exception:
+            logger.exception("content_safety_unexpected_error")
             return {'allowed': False, 'categories': {}}
@@ -1,16 +1,27 @@
+import itertools
 import time
 from typing import List, Dict
+from alert_broker import publish
+from alert_delivery import enqueue_alert
 
 _alerts: List[Dict] = []
+# Seeded from the wall clock (microseconds) at boot, so ids keep increasing
+# across restarts and a moderator's Last-Event-ID from an earlier boot never
+# hides new alerts.
+_alert_ids = itertools.count(time.time_ns() // 1000)
 
 
 def trigger_alert(kind: str, session_id: str, detail: dict):
-    _alerts.append({
+    alert = {
+        'id': next(_alert_ids),
         'timestamp': time.time(),
         'kind': kind,
         'session_id': session_id,
         'detail': detail
-    })
+    }
+    _alerts.append(alert)
+    publish(alert)
+    enqueue_alert(alert)
 
 
 def list_alerts(limit: int = 50) -> List[Dict]:
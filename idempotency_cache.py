@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Tuple
+from config_loader import load_config
+
+# Idempotency-Key support for POST /api/chat.
+# The first request with a key runs the turn. Concurrent retries with the same
+# key await the same in-flight future. Later retries get the stored response
+# until its TTL expires. Keys are scoped per user, and a key reused for a
+# different request is rejected. Completed entries are kept in completion
+# order, so expiry and size-bound eviction both pop from the front.
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request."""
+
+
+@dataclass(eq=False)
+class _Entry:
+    fingerprint: str
+    response: dict
+    size: int
+    expires_at: float
+
+
+_in_flight: Dict[Tuple[str, str], Tuple[str, asyncio.Future]] = {}
+_completed: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+_stored_bytes = 0
+_stats = {'misses': 0, 'replays': 0, 'joins': 0, 'conflicts': 0, 'evictions': 0, 'not_stored': 0}
+
+
+def idempotency_settings() -> dict:
+    cfg = load_config().get('idempotency', {})
+    return {
+        'ttl_seconds': cfg.get('ttl_seconds', 600),
+        'max_entries': cfg.get('max_entries', 10000),
+        'max_total_bytes': cfg.get('max_total_bytes', 32 * 1024 * 1024),
+        'max_key_length': cfg.get('max_key_length', 128),
+    }
+
+
+def request_fingerprint(*parts: str) -> str:
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _drop_front():
+    global _stored_bytes
+    _, entry = _completed.popitem(last=False)
+    _stored_bytes -= entry.size
+
+
+def _sweep(now: float, settings: dict):
+    while _completed and next(iter(_completed.values())).expires_at <= now:
+        _drop_front()
+    while _completed and (len(_completed) > settings['max_entries'] or _stored_bytes > settings['max_total_bytes']):
+        _drop_front()
+        _stats['evictions'] += 1
+
+
+def _store(key: Tuple[str, str], fingerprint: str, response: dict, settings: dict):
+    global _stored_bytes
+    size = len(json.dumps(response, default=str))
+    if size > settings['max_total_bytes']:
+        return
+    _completed[key] = _Entry(fingerprint, response, size, time.monotonic() + settings['ttl_seconds'])
+    _stored_bytes += size
+    _sweep(time.monotonic(), settings)
+
+
+async def run_once(
+    scope: str,
+    idempotency_key: str,
+    fingerprint: str,
+    compute: Callable[[], Awaitable[dict]],
+    should_store: Callable[[dict], bool] = lambda response: True
+) -> Tuple[dict, bool]:
+    """Return (response, replayed). `compute` runs at most once per live key.
+
+    Failures are not stored: exceptions, and responses `should_store` rejects
+    (e.g. an upstream error reported as a reply). Concurrent retries still
+    share that response, but the next retry with the key runs again.
+    """
+    settings = idempotency_settings()
+    key = (scope, idempotency_key)
+    while True:
+        _sweep(time.monotonic(), settings)
+        entry = _completed.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                _stats['conflicts'] += 1
+                raise IdempotencyConflict(idempotency_key)
+            _stats['replays'] += 1
+            return entry.response, True
+        pending = _in_flight.get(key)
+        if pending is None:
+            break
+        if pending[0] != fingerprint:
+            _stats['conflicts'] += 1
+            raise IdempotencyConflict(idempotency_key)
+        _stats['joins'] += 1
+        try:
+            return await asyncio.shield(pending[1]), True
+        except asyncio.CancelledError:
+            if not pending[1].cancelled():
+                raise  # this request itself was cancelled
+            # The original was cancelled; loop round and run it here instead
+
+    _stats['misses'] += 1
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = (fingerprint, future)
+    try:
+        response = await compute()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # joiners see it; don't warn when there are none
+        raise
+    finally:
+        del _in_flight[key]
+    future.set_result(response)
+    if should_store(response):
+        _store(key, fingerprint, response, settings)
+    else:
+        _stats['not_stored'] += 1
+    return response, False
+
+
+def idempotency_stats() -> dict:
+    return {**_stats, 'in_flight': len(_in_flight), 'stored': len(_completed), 'stored_bytes': _stored_bytes}
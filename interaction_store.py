@@ -1,7 +1,15 @@
-from collections import defaultdict, deque
-from dataclasses import dataclass
-from typing import Deque, Dict, List, Optional
+from collections import OrderedDict, deque
+from dataclasses import dataclass, asdict
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import json
+import logging
+import os
+import queue
+import sys
+import threading
 import time
+from config_loader import load_config
+from text_normalizer import normalize_text
 
 @dataclass
 class Interaction:
@@ -9,13 +17,172 @@ class Interaction:
     content: str
     timestamp: float
     categories: Optional[dict] = None  # content safety categories if available
+    normalized: Optional[str] = None  # canonical matching form (text_normalizer), computed once
 
-# In-memory store keyed by session_id
-_store: Dict[str, Deque[Interaction]] = defaultdict(lambda: deque(maxlen=100))
+logger = logging.getLogger(__name__)
 
+# In-memory store keyed by session_id, least recently active session first.
+# Each session's approximate footprint is tracked so the whole store can be
+# held under a byte budget by evicting idle sessions in LRU order.
+# Evicted sessions can be spilled to a JSONL journal (off by default). All
+# journal file I/O, appends and retention pruning alike, runs on one writer
+# thread fed by a queue, so the chat path never blocks on disk.
+_store: "OrderedDict[str, Deque[Interaction]]" = OrderedDict()
+_session_bytes: Dict[str, int] = {}
+_total_bytes = 0
+_stats = {'evicted_sessions': 0, 'spilled_interactions': 0, 'journal_pruned_lines': 0}
+_journal_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+_journal_thread: Optional[threading.Thread] = None
+_session_listeners: List[Callable[[str], None]] = []
 
-def add_interaction(session_id: str, role: str, content: str, categories: dict | None = None):
-    _store[session_id].append(Interaction(role=role, content=content, timestamp=time.time(), categories=categories))
+# Rough per-object overheads (CPython, 64-bit) on top of the content strings
+_INTERACTION_OVERHEAD_BYTES = 200
+_SESSION_OVERHEAD_BYTES = 800
+
+
+def _settings() -> dict:
+    cfg = load_config().get('interaction_store', {})
+    return {
+        'max_interactions_per_session': cfg.get('max_interactions_per_session', 100),
+        'max_bytes': int(os.getenv('INTERACTION_STORE_MAX_BYTES', cfg.get('max_bytes', 0))),
+        'spill_journal_path': os.getenv('INTERACTION_JOURNAL_PATH', cfg.get('spill_journal_path') or ''),
+    }
+
+
+def _interaction_size(interaction: Interaction) -> int:
+    size = _INTERACTION_OVERHEAD_BYTES + sys.getsizeof(interaction.content)
+    if interaction.categories:
+        size += sys.getsizeof(interaction.categories)
+    if interaction.normalized is not interaction.content:
+        size += sys.getsizeof(interaction.normalized)
+    return size
+
+
+def _account(session_id: str, delta: int):
+    global _total_bytes
+    _session_bytes[session_id] += delta
+    _total_bytes += delta
+
+
+def add_session_listener(callback: Callable[[str], None]):
+    """Register `callback(session_id)`, called after a session loses history outside add_interaction."""
+    _session_listeners.append(callback)
+
+
+def _notify(session_id: str):
+    for callback in _session_listeners:
+        callback(session_id)
+
+
+def _drop_session(session_id: str) -> Deque[Interaction]:
+    global _total_bytes
+    _total_bytes -= _session_bytes.pop(session_id, 0)
+    return _store.pop(session_id)
+
+
+def _rewrite_journal(path: str, cutoff: float):
+    if not os.path.exists(path):
+        return
+    kept_path = path + '.tmp'
+    pruned = 0
+    with open(path, encoding='utf-8') as source, open(kept_path, 'w', encoding='utf-8') as kept:
+        for line in source:
+            try:
+                keep = json.loads(line)['timestamp'] >= cutoff
+            except (ValueError, KeyError, TypeError):
+                keep = False
+            if keep:
+                kept.write(line)
+            else:
+                pruned += 1
+    os.replace(kept_path, path)
+    _stats['journal_pruned_lines'] += pruned
+
+
+def _journal_worker():
+    handle, handle_path = None, None
+    while True:
+        op, path, payload = _journal_queue.get()
+        try:
+            if op == 'flush':
+                payload.set()
+                continue
+            if path != handle_path and handle is not None:
+                handle.close()
+                handle = None
+            handle_path = path
+            if op == 'append':
+                session_id, interactions = payload
+                if handle is None:
+                    handle = open(path, 'a', encoding='utf-8')
+                for interaction in interactions:
+                    handle.write(json.dumps({'session_id': session_id, **asdict(interaction)}) + '\n')
+                handle.flush()
+            elif op == 'prune':
+                if handle is not None:
+                    handle.close()
+                    handle = None
+                _rewrite_journal(path, payload)
+        except Exception:
+            logger.exception("interaction_journal_error")
+
+
+def _journal_submit(op: str, path: str, payload):
+    global _journal_thread
+    if _journal_thread is None:
+        _journal_thread = threading.Thread(target=_journal_worker, name='interaction-journal', daemon=True)
+        _journal_thread.start()
+    _journal_queue.put((op, path, payload))
+
+
+def flush_journal(timeout: float = 5.0) -> bool:
+    """Wait until queued journal writes are on disk. For shutdown and tests."""
+    if _journal_thread is None:
+        return True
+    done = threading.Event()
+    _journal_queue.put(('flush', None, done))
+    return done.wait(timeout)
+
+
+def _spill(session_id: str, interactions: Deque[Interaction], path: str):
+    # Serialized and written on the journal thread
+    _journal_submit('append', path, (session_id, list(interactions)))
+    _stats['spilled_interactions'] += len(interactions)
+
+
+def _enforce_budget(settings: dict):
+    max_bytes = settings['max_bytes']
+    # The most recently active session is never evicted to make room for itself.
+    while max_bytes and _total_bytes > max_bytes and len(_store) > 1:
+        session_id = next(iter(_store))
+        evicted = _drop_session(session_id)
+        _stats['evicted_sessions'] += 1
+        if settings['spill_journal_path']:
+            _spill(session_id, evicted, settings['spill_journal_path'])
+        _notify(session_id)
+
+
+def add_interaction(session_id: str, role: str, content: str, categories: dict | None = None, normalized: str | None = None):
+    """Append a turn. Pass `normalized` when the caller already computed it for this message."""
+    global _total_bytes
+    settings = _settings()
+    if normalized is None:
+        normalized = normalize_text(content)
+    if normalized == content:
+        normalized = content  # share the string instead of keeping two copies
+    dq = _store.get(session_id)
+    if dq is None:
+        dq = _store[session_id] = deque(maxlen=settings['max_interactions_per_session'])
+        _session_bytes[session_id] = _SESSION_OVERHEAD_BYTES
+        _total_bytes += _SESSION_OVERHEAD_BYTES
+    else:
+        _store.move_to_end(session_id)
+    if len(dq) == dq.maxlen:
+        _account(session_id, -_interaction_size(dq[0]))
+    interaction = Interaction(role=role, content=content, timestamp=time.time(), categories=categories, normalized=normalized)
+    dq.append(interaction)
+    _account(session_id, _interaction_size(interaction))
+    _enforce_budget(settings)
 
 
 def get_recent_interactions(session_id: str, limit: int = 20) -> List[Interaction]:
@@ -27,16 +194,56 @@ def get_recent_interactions(session_id: str, limit: int = 20) -> List[Interactio
 
 def prune_older_than(seconds: int):
     cutoff = time.time() - seconds
+    maxlen = _settings()['max_interactions_per_session']
     to_delete = []
+    changed = []
     for session_id, dq in _store.items():
-        filtered = deque([i for i in dq if i.timestamp >= cutoff], maxlen=100)
+        filtered = deque([i for i in dq if i.timestamp >= cutoff], maxlen=maxlen)
+        if len(filtered) == len(dq):
+            continue
         if filtered:
             _store[session_id] = filtered
+            removed = sum(_interaction_size(i) for i in dq) - sum(_interaction_size(i) for i in filtered)
+            _account(session_id, -removed)
+            changed.append(session_id)
         else:
             to_delete.append(session_id)
     for sid in to_delete:
-        del _store[sid]
+        _drop_session(sid)
+    for sid in changed + to_delete:
+        _notify(sid)
+    # Spilled transcripts fall under the same retention as in-memory ones
+    journal = _settings()['spill_journal_path']
+    if journal:
+        _journal_submit('prune', journal, cutoff)
 
 
 def list_sessions() -> List[str]:
     return list(_store.keys())
+
+
+def iter_sessions() -> Iterator[Tuple[str, List[Interaction]]]:
+    """Yield (session_id, interactions) over a snapshot of the session ids.
+
+    Sessions dropped while the iterator is suspended are skipped; each
+    session's history is copied only when it is reached.
+    """
+    for session_id in list(_store):
+        dq = _store.get(session_id)
+        if dq is not None:
+            yield session_id, list(dq)
+
+
+def journal_path() -> str:
+    """Spill journal receiving evicted sessions, or '' when spilling is off."""
+    return _settings()['spill_journal_path']
+
+
+def store_stats() -> dict:
+    """Current footprint for capacity planning."""
+    return {
+        'sessions': len(_store),
+        'bytes': _total_bytes,
+        'max_bytes': _settings()['max_bytes'],
+        **_stats,
+    }
@@ -1,25 +1,59 @@
+import re
+from functools import lru_cache
 from config_loader import load_config
+from text_normalizer import normalize_text, normalize_with_offsets
+
+REPLACEMENT = "I'm designed to assist"
+
+
+@lru_cache(maxsize=1)
+def _banned_patterns() -> list[tuple[str, re.Pattern]]:
+    # Normalized once for detection, plus a case-insensitive pattern for replacement
+    cfg = load_config()
+    banned = cfg.get('anthropomorphism', {}).get('banned_phrases', [])
+    return [(normalize_text(phrase), re.compile(re.escape(phrase), re.IGNORECASE)) for phrase in banned]
+
+
+def _replace_obfuscated(text: str, phrase: str) -> tuple[str, int]:
+    # Locate the phrase in the matching form and replace the original span it
+    # came from, so the rest of the reply keeps its case, digits and line breaks.
+    mapped, origins = normalize_with_offsets(text)
+    spans = []
+    start = mapped.find(phrase)
+    while start != -1:
+        end = start + len(phrase)
+        spans.append((origins[start], origins[end - 1] + 1))
+        start = mapped.find(phrase, end)
+    for begin, end in reversed(spans):
+        text = text[:begin] + REPLACEMENT + text[end:]
+    return text, len(spans)
 
 
 def cleanse_output(text: str, age_band: str = 'adult') -> tuple[str, bool, str]:
     """
-    Remove or neutralize anthropomorphic phrases. 
+    Remove or neutralize anthropomorphic phrases.
     Returns (cleaned_text, was_modified, explanation_message).
     """
-    cfg = load_config()
-    banned = cfg.get('anthropomorphism', {}).get('banned_phrases', [])
     modified = False
     explanation = ""
-    
-    for phrase in banned:
-        if phrase.lower() in text.lower():
+    normalized = normalize_text(text)
+
+    for phrase, pattern in _banned_patterns():
+        if phrase in normalized:
             # Simple replacement strategy
-            text = text.replace(phrase, "I'm designed to assist")
-            modified = True
-    
+            text, count = pattern.subn(REPLACEMENT, text)
+            normalized = normalize_text(text)
+            if phrase in normalized:
+                # Copies obfuscated or split across lines in the original; replace the spans they map back to
+                text, obfuscated = _replace_obfuscated(text, phrase)
+                count += obfuscated
+                normalized = normalize_text(text)
+            if count:
+                modified = True
+
     # Add age-appropriate explanation if modified
     if modified:
         from safety_messaging import get_anthropomorphism_explanation
         explanation = get_anthropomorphism_explanation(age_band)
-    
+
     return text, modified, explanation
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from config_loader import load_config
+
+# Event-loop diagnostics.
+# The lag monitor is a coroutine that sleeps a fixed interval and measures how
+# late it wakes up. A watchdog thread watches the same heartbeat. When the loop
+# has not come back within the stall threshold, the watchdog grabs the loop
+# thread's current stack, i.e. the code that is blocking it. The sampling
+# profiler also runs off-loop and emits collapsed stacks (flamegraph.pl /
+# speedscope "folded" format).
+
+
+def diagnostics_settings() -> dict:
+    cfg = load_config().get('diagnostics', {})
+    return {
+        'lag_check_interval_ms': cfg.get('lag_check_interval_ms', 100),
+        'stall_threshold_ms': cfg.get('stall_threshold_ms', 100),
+        'max_recorded_stalls': cfg.get('max_recorded_stalls', 50),
+        'profile_max_seconds': cfg.get('profile_max_seconds', 30),
+    }
+
+
+_stalls: Deque[Dict] = deque(maxlen=diagnostics_settings()['max_recorded_stalls'])
+_lag_stats = {'checks': 0, 'stalls': 0, 'max_lag_ms': 0.0, 'last_lag_ms': 0.0}
+_loop_thread_id: Optional[int] = None
+_last_beat = 0.0
+_captured: Optional[Tuple[float, List[str]]] = None  # (beat it belongs to, stack)
+_profile_lock = threading.Lock()
+
+
+def _format_stack(frame) -> List[str]:
+    return [f"{fs.filename}:{fs.lineno} in {fs.name}" for fs in traceback.extract_stack(frame)]
+
+
+def _watchdog(interval: float, threshold: float):
+    global _captured
+    while True:
+        time.sleep(interval / 2)
+        beat = _last_beat
+        if time.monotonic() - beat <= interval + threshold:
+            continue
+        if _captured is not None and _captured[0] == beat:
+            continue  # already have the stack for this stall
+        frame = sys._current_frames().get(_loop_thread_id)
+        if frame is not None:
+            _captured = (beat, _format_stack(frame))
+
+
+async def lag_monitor_loop():
+    global _loop_thread_id, _last_beat
+    settings = diagnostics_settings()
+    interval = settings['lag_check_interval_ms'] / 1000
+    threshold = settings['stall_threshold_ms'] / 1000
+    _loop_thread_id = threading.get_ident()
+    _last_beat = time.monotonic()
+    threading.Thread(target=_watchdog, args=(interval, threshold), name='loop-watchdog', daemon=True).start()
+    while True:
+        beat = _last_beat = time.monotonic()
+        await asyncio.sleep(interval)
+        lag = time.monotonic() - beat - interval
+        _lag_stats['checks'] += 1
+        _lag_stats['last_lag_ms'] = round(lag * 1000, 1)
+        _lag_stats['max_lag_ms'] = max(_lag_stats['max_lag_ms'], _lag_stats['last_lag_ms'])
+        if lag > threshold:
+            _lag_stats['stalls'] += 1
+            captured = _captured
+            _stalls.append({
+                'timestamp': time.time(),
+                'duration_ms': round(lag * 1000, 1),
+                'stack': captured[1] if captured and captured[0] == beat else None,
+            })
+
+
+def lag_stats() -> Dict:
+    return dict(_lag_stats)
+
+
+def recent_stalls() -> List[Dict]:
+    return list(_stalls)
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def sample_profile(seconds: float, interval: float = 0.005, loop_only: bool = True) -> str:
+    """Sample stacks of the live process for `seconds` and return folded stacks.
+
+    Blocking; call it from a worker thread. With `loop_only` only the event-loop
+    thread is sampled (falls back to all threads before the monitor has started).
+    Raises RuntimeError if another profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError('a profile is already running')
+    try:
+        me = threading.get_ident()
+        counts: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                if loop_only and _loop_thread_id is not None and thread_id != _loop_thread_id:
+                    continue
+                counts[_collapse(frame)] += 1
+            time.sleep(interval)
+        return ''.join(f"{stack} {n}\n" for stack, n in counts.most_common())
+    finally:
+        _profile_lock.release()
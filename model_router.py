@@ -0,0 +1,253 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+from openai import APIConnectionError, AsyncAzureOpenAI
+from config_loader import load_config
+from quota_scheduler import OutboundScheduler, QuotaWaitTimeout
+
+logger = logging.getLogger(__name__)
+
+# Routing of completions across several Azure OpenAI deployments.
+# Routes in `model_routing.routes` are matched in order on age band, message
+# length and history size; the first match names the candidate deployments,
+# cheapest/preferred first. Each deployment has its own client and TPM/RPM
+# scheduler and keeps a rolling window of latencies and outcomes. A deployment
+# that fails repeatedly (or whose error rate crosses the threshold) is cooled
+# down and skipped. A failed call moves on to the next candidate. With the
+# `balanced` strategy, healthy candidates are ordered by p50 latency scaled by
+# their in-flight load instead of by preference. Only deployment faults (5xx,
+# timeouts, connection errors, exhausted 429s) fail over or count towards a
+# cooldown; a 4xx such as a content_filter 400 is about the request and is
+# raised at once. Without configured deployments the single
+# AZURE_OPENAI_DEPLOYMENT is used as before.
+
+
+def is_deployment_failure(exc: BaseException) -> bool:
+    """True if `exc` says the deployment is unhealthy rather than the request invalid."""
+    status = getattr(exc, 'status_code', None)
+    if status is not None:
+        return status >= 500 or status in (408, 429)
+    return isinstance(exc, (APIConnectionError, asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+
+@dataclass(eq=False)
+class Deployment:
+    name: str
+    model: str
+    client: Any
+    scheduler: OutboundScheduler
+    latency_window: int = 200
+    latencies: Deque[float] = field(init=False)
+    outcomes: Deque[bool] = field(init=False)
+    in_flight: int = 0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+    stats: Dict[str, int] = field(default_factory=lambda: {'calls': 0, 'failures': 0, 'failovers_from': 0, 'cooldowns': 0})
+
+    def __post_init__(self):
+        self.latencies = deque(maxlen=self.latency_window)
+        self.outcomes = deque(maxlen=self.latency_window)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+
+class ModelRouter:
+    def __init__(
+        self,
+        deployments: List[Deployment],
+        routes: Optional[List[dict]] = None,
+        strategy: str = 'failover',
+        error_rate_threshold: float = 0.5,
+        min_samples: int = 10,
+        max_consecutive_failures: int = 3,
+        cooldown_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.deployments = {d.name: d for d in deployments}
+        self.routes = routes or []
+        self.strategy = strategy
+        self.error_rate_threshold = error_rate_threshold
+        self.min_samples = min_samples
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+
+    def _route_for(self, age_band: str, message_chars: int, history_size: int) -> dict:
+        for route in self.routes:
+            if 'age_bands' in route and age_band not in route['age_bands']:
+                continue
+            if message_chars < route.get('min_message_chars', 0):
+                continue
+            if 'max_message_chars' in route and message_chars > route['max_message_chars']:
+                continue
+            if history_size < route.get('min_history', 0):
+                continue
+            if 'max_history' in route and history_size > route['max_history']:
+                continue
+            return route
+        return {}
+
+    def candidates(self, age_band: str, message_chars: int, history_size: int) -> List[Deployment]:
+        """Deployments to try in order: healthy ones first, cooled-down ones as a last resort."""
+        route = self._route_for(age_band, message_chars, history_size)
+        names = route.get('deployments') or list(self.deployments)
+        preferred = [self.deployments[n] for n in names if n in self.deployments]
+        now = self._clock()
+        healthy = [d for d in preferred if d.available(now)]
+        if route.get('strategy', self.strategy) == 'balanced':
+            healthy.sort(key=lambda d: (d.percentile(0.5) or 0.0) * (d.in_flight + 1))
+        return healthy + [d for d in preferred if not d.available(now)]
+
+    def _record_success(self, deployment: Deployment, latency: float):
+        deployment.latencies.append(latency)
+        deployment.outcomes.append(True)
+        deployment.consecutive_failures = 0
+
+    def record_failure(self, deployment: Deployment):
+        deployment.outcomes.append(False)
+        deployment.consecutive_failures += 1
+        deployment.stats['failures'] += 1
+        tripped = deployment.consecutive_failures >= self.max_consecutive_failures or (
+            len(deployment.outcomes) >= self.min_samples and deployment.error_rate() >= self.error_rate_threshold
+        )
+        if tripped and deployment.available(self._clock()):
+            deployment.cooldown_until = self._clock() + self.cooldown_seconds
+            deployment.stats['cooldowns'] += 1
+            logger.warning("llm_deployment_cooldown", extra={"fields": {
+                "deployment": deployment.name, "error_rate": round(deployment.error_rate(), 3)
+            }})
+
+    async def call(
+        self,
+        candidates: List[Deployment],
+        make_call: Callable[[Deployment], Awaitable[Any]],
+        estimated_tokens: int,
+        priority: int = 0,
+        usage_of: Callable[[Any], Optional[int]] = lambda result: None,
+        defer_usage: bool = False,
+    ) -> Tuple[Deployment, Any]:
+        """Run `make_call(deployment)` on the first candidate that succeeds.
+
+        All candidates share one queue-wait budget: the first candidate's
+        `max_queue_wait`, counted from this call on that scheduler's clock and
+        handed to each candidate as a deadline on its own clock.
+        """
+        last_error: Optional[Exception] = None
+        first = candidates[0].scheduler if candidates else None
+        deadline = first.now() + first.max_queue_wait if first else None
+        for deployment in candidates:
+            deployment.stats['calls'] += 1
+            deployment.in_flight += 1
+            started = self._clock()
+            try:
+                result = await deployment.scheduler.run(
+                    functools.partial(make_call, deployment),
+                    estimated_tokens=estimated_tokens,
+                    priority=priority,
+                    usage_of=usage_of,
+                    defer_usage=defer_usage,
+                    deadline=deployment.scheduler.now() + (deadline - first.now())
+                )
+            except QuotaWaitTimeout as e:
+                # Local quota, not a deployment fault: try the next one without penalty
+                last_error = e
+            except Exception as e:
+                if not is_deployment_failure(e):
+                    raise
+                self.record_failure(deployment)
+                last_error = e
+            else:
+                self._record_success(deployment, self._clock() - started)
+                return deployment, result
+            finally:
+                deployment.in_flight -= 1
+            deployment.stats['failovers_from'] += 1
+            logger.warning("llm_failover", extra={"fields": {
+                "deployment": deployment.name, "error": type(last_error).__name__
+            }})
+        if last_error is None:
+            raise RuntimeError("no model deployments configured")
+        raise last_error
+
+    def snapshot(self) -> dict:
+        now = self._clock()
+        return {
+            d.name: {
+                **d.stats,
+                'model': d.model,
+                'p50_ms': None if d.percentile(0.5) is None else round(d.percentile(0.5) * 1000, 1),
+                'p95_ms': None if d.percentile(0.95) is None else round(d.percentile(0.95) * 1000, 1),
+                'error_rate': round(d.error_rate(), 3),
+                'in_flight': d.in_flight,
+                'cooling_down_for': round(max(0.0, d.cooldown_until - now), 1),
+                'scheduler': d.scheduler.snapshot(),
+            }
+            for d in self.deployments.values()
+        }
+
+
+def _quota(cfg: dict, key: str, outbound: dict) -> int:
+    """Per-deployment limit: `<key>_env` variable, then the deployment's `<key>`, then `outbound`."""
+    env_name = cfg.get(f'{key}_env')
+    value = os.getenv(env_name) if env_name else None
+    return int(value or cfg.get(key, outbound.get(key, 0)))
+
+
+def _deployment_from_config(name: str, cfg: dict, outbound: dict, latency_window: int) -> Deployment:
+    env = os.getenv
+    client = AsyncAzureOpenAI(
+        api_key=env(cfg.get('api_key_env', 'AZURE_OPENAI_API_KEY')),
+        api_version=env(cfg.get('api_version_env', 'AZURE_OPENAI_API_VERSION')),
+        azure_endpoint=cfg.get('endpoint') or env(cfg.get('endpoint_env', 'AZURE_OPENAI_ENDPOINT')),
+        # 0: the SDK would otherwise retry 429s itself, sleeping on retry-after
+        # behind the scheduler's back; throttling belongs to the scheduler and router
+        max_retries=cfg.get('client_max_retries', 0)
+    )
+    scheduler = OutboundScheduler(
+        tokens_per_minute=_quota(cfg, 'tokens_per_minute', outbound),
+        requests_per_minute=_quota(cfg, 'requests_per_minute', outbound),
+        max_queue_wait=cfg.get('max_queue_wait_seconds', outbound.get('max_queue_wait_seconds', 10)),
+        max_throttle_retries=cfg.get('max_throttle_retries', outbound.get('max_throttle_retries', 3)),
+    )
+    model = cfg.get('deployment') or env(cfg.get('deployment_env', 'AZURE_OPENAI_DEPLOYMENT'))
+    return Deployment(name=name, model=model, client=client, scheduler=scheduler, latency_window=latency_window)
+
+
+def build_router() -> ModelRouter:
+    config = load_config()
+    cfg = config.get('model_routing', {})
+    outbound = config.get('outbound', {})
+    latency_window = cfg.get('latency_window', 200)
+    configured = cfg.get('deployments') or {}
+    if configured:
+        deployments = [_deployment_from_config(name, d or {}, outbound, latency_window) for name, d in configured.items()]
+    else:
+        # Single deployment from the environment, paced by the `outbound` quota as before
+        deployments = [_deployment_from_config('default', {
+            'tokens_per_minute_env': 'AZURE_OPENAI_TPM',
+            'requests_per_minute_env': 'AZURE_OPENAI_RPM',
+        }, outbound, latency_window)]
+    return ModelRouter(
+        deployments,
+        routes=cfg.get('routes'),
+        strategy=cfg.get('strategy', 'failover'),
+        error_rate_threshold=cfg.get('error_rate_threshold', 0.5),
+        min_samples=cfg.get('min_samples', 10),
+        max_consecutive_failures=cfg.get('max_consecutive_failures', 3),
+        cooldown_seconds=cfg.get('cooldown_seconds', 30),
+    )
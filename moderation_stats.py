@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from config_loader import load_config
+
+# Incremental moderation rollups for /api/mod/stats.
+# Each event is counted into the current slot of two fixed-size rings: one
+# bucket per minute and one per hour. A slot is reset lazily when its time
+# window comes round again, so recording is O(1). Reading is O(buckets) and
+# independent of traffic. Event keys are tuples such as
+# ('blocks', 'content_safety', 'child', 'violence'), reported as nested dicts.
+
+Key = Tuple[str, ...]
+
+
+class _Ring:
+    def __init__(self, width_seconds: int, slots: int):
+        self.width = width_seconds
+        self.slots = slots
+        self._starts: List[Optional[int]] = [None] * slots
+        self._counts: List[Counter] = [Counter() for _ in range(slots)]
+
+    def add(self, key: Key, now: float):
+        period = int(now // self.width)
+        slot = period % self.slots
+        start = period * self.width
+        if self._starts[slot] != start:
+            self._starts[slot] = start
+            self._counts[slot].clear()
+        self._counts[slot][key] += 1
+
+    def live(self, now: float) -> List[Tuple[int, Counter]]:
+        """Buckets inside the ring's window, oldest first."""
+        oldest = (int(now // self.width) - self.slots + 1) * self.width
+        return sorted(
+            (start, counts) for start, counts in zip(self._starts, self._counts)
+            if start is not None and start >= oldest
+        )
+
+
+def _stats_settings() -> dict:
+    cfg = load_config().get('moderation_stats', {})
+    return {
+        'minute_buckets': cfg.get('minute_buckets', 60),
+        'hour_buckets': cfg.get('hour_buckets', 24),
+    }
+
+
+_settings = _stats_settings()
+_minutes = _Ring(60, _settings['minute_buckets'])
+_hours = _Ring(3600, _settings['hour_buckets'])
+
+
+def record(*key: str):
+    now = time.time()
+    _minutes.add(key, now)
+    _hours.add(key, now)
+
+
+def _nest(counts: Counter) -> Dict:
+    tree: Dict = {}
+    for key, n in counts.items():
+        node = tree
+        for part in key[:-1]:
+            node = node.setdefault(part, {})
+        node[key[-1]] = node.get(key[-1], 0) + n
+    return tree
+
+
+def _summary(counts: Counter) -> Dict:
+    summary = _nest(counts)
+    messages = summary.get('messages', {})
+    blocks_by_band = Counter()
+    for key, n in counts.items():
+        if key[0] == 'blocks':
+            blocks_by_band[key[2]] += n
+    summary['block_rate'] = {
+        band: round(blocks_by_band[band] / total, 4) for band, total in messages.items() if total
+    }
+    return summary
+
+
+def _rollup(ring: _Ring, now: float) -> Dict:
+    buckets = ring.live(now)
+    total = Counter()
+    for _, counts in buckets:
+        total.update(counts)
+    return {
+        'window_seconds': ring.width * ring.slots,
+        'totals': _summary(total),
+        'buckets': [{'start': start, **_nest(counts)} for start, counts in buckets],
+    }
+
+
+def moderation_rollups() -> Dict:
+    now = time.time()
+    return {'per_minute': _rollup(_minutes, now), 'per_hour': _rollup(_hours, now)}
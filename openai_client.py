@@ -1,41 +1,119 @@
-import os
-from openai import AsyncAzureOpenAI
+import logging
+from typing import AsyncIterator
 from dotenv import load_dotenv
 from prompt_manager import build_system_prompt
 from interaction_store import get_recent_interactions
+from config_loader import load_config
+from quota_scheduler import QuotaWaitTimeout, estimate_tokens
+from moderation_stats import record as record_stat
+from model_router import build_router, is_deployment_failure
 
 load_dotenv()
 
-client = AsyncAzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
+logger = logging.getLogger(__name__)
+
+# One client and TPM/RPM scheduler per deployment (model_routing in safety_config.yaml)
+router = build_router()
+_outbound_cfg = load_config().get('outbound', {})
+
+
+QUOTA_BUSY_MESSAGE = "⚠️ I'm answering a lot of questions right now. Please try again in a moment."
+LLM_ERROR_MESSAGE = "⚠️ Sorry, I couldn't process your request."
+# Replies that stand in for a failed completion; callers must not treat them as answers
+LLM_FAILURE_MESSAGES = frozenset({QUOTA_BUSY_MESSAGE, LLM_ERROR_MESSAGE})
+
+
+def _usage_tokens(response) -> int | None:
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None)
+
+
+def _build_messages(user_message: str, age_band: str, session_id: str | None) -> list:
+    system_prompt = build_system_prompt(age_band)
+    
+    # Build conversation history from session
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    if session_id:
+        # Get recent conversation history (excluding the current message)
+        history = get_recent_interactions(session_id, limit=10)  # Last 10 interactions
+        for interaction in history:
+            if interaction.role == 'user':
+                messages.append({"role": "user", "content": interaction.content})
+            elif interaction.role == 'bot':
+                messages.append({"role": "assistant", "content": interaction.content})
+    
+    # Add the current user message
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
 
 async def get_llm_response(user_message: str, age_band: str = 'adult', session_id: str = None) -> str:
     try:
-        system_prompt = build_system_prompt(age_band)
-        
-        # Build conversation history from session
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        if session_id:
-            # Get recent conversation history (excluding the current message)
-            history = get_recent_interactions(session_id, limit=10)  # Last 10 interactions
-            for interaction in history:
-                if interaction.role == 'user':
-                    messages.append({"role": "user", "content": interaction.content})
-                elif interaction.role == 'bot':
-                    messages.append({"role": "assistant", "content": interaction.content})
-        
-        # Add the current user message
-        messages.append({"role": "user", "content": user_message})
-        
-        response = await client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-            messages=messages
+        messages = _build_messages(user_message, age_band, session_id)
+
+        # Routed by age band / length / history, paced per deployment; younger age bands are served first
+        _, response = await router.call(
+            router.candidates(age_band, len(user_message), len(messages) - 2),
+            lambda deployment: deployment.client.chat.completions.create(
+                model=deployment.model,
+                messages=messages
+            ),
+            estimated_tokens=estimate_tokens(messages, _outbound_cfg.get('expected_completion_tokens', 0)),
+            priority=_outbound_cfg.get('priorities', {}).get(age_band, 0),
+            usage_of=_usage_tokens
         )
         return response.choices[0].message.content
+    except QuotaWaitTimeout:
+        logger.warning("llm_quota_wait_exceeded", extra={"fields": {"age_band": age_band}})
+        record_stat('llm_errors', 'quota_wait')
+        return QUOTA_BUSY_MESSAGE
+    except Exception:
+        logger.exception("llm_error")
+        record_stat('llm_errors', 'exception')
+        return LLM_ERROR_MESSAGE
+
+
+async def stream_llm_response(user_message: str, age_band: str = 'adult', session_id: str = None) -> AsyncIterator[str]:
+    """Yield the completion as text deltas. Errors are reported in-band like get_llm_response."""
+    expected_completion = _outbound_cfg.get('expected_completion_tokens', 0)
+    # Final usage chunk; needs an API version that accepts stream_options
+    stream_options = {'stream_options': {'include_usage': True}} if _outbound_cfg.get('stream_include_usage') else {}
+    deployment = None
+    try:
+        messages = _build_messages(user_message, age_band, session_id)
+        estimated = estimate_tokens(messages, expected_completion)
+        # Failover happens while opening the stream, before any text is yielded
+        deployment, (stream, settle) = await router.call(
+            router.candidates(age_band, len(user_message), len(messages) - 2),
+            lambda deployment: deployment.client.chat.completions.create(
+                model=deployment.model,
+                messages=messages,
+                stream=True,
+                **stream_options
+            ),
+            estimated_tokens=estimated,
+            priority=_outbound_cfg.get('priorities', {}).get(age_band, 0),
+            defer_usage=True
+        )
+        streamed_chars = 0
+        usage = None
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    streamed_chars += len(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+                usage = _usage_tokens(chunk) or usage
+        finally:
+            # Correct the reservation itself; without a usage chunk, count ~4 characters per streamed token
+            settle(usage if usage is not None else estimated - expected_completion + streamed_chars // 4)
+    except QuotaWaitTimeout:
+        logger.warning("llm_quota_wait_exceeded", extra={"fields": {"age_band": age_band}})
+        record_stat('llm_errors', 'quota_wait')
+        yield QUOTA_BUSY_MESSAGE
     except Exception as e:
-        print(f"OpenAI API error: {str(e)}")
-        return "⚠️ Sorry, I couldn't process your request."
+        logger.exception("llm_error")
+        record_stat('llm_errors', 'exception')
+        if deployment is not None and is_deployment_failure(e):
+            router.record_failure(deployment)  # broke mid-stream
+        yield LLM_ERROR_MESSAGE
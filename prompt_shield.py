@@ -2,12 +2,17 @@
 # Copyright (c) Microsoft. All rights reserved.
 # To learn more, please visit the documentation - Quickstart: Azure Content Safety: https://aka.ms/acsstudiodoc
 #
+import logging
 import os
 import requests
 from dotenv import load_dotenv
+from jailbreak_index import index as jailbreak_index
+from text_normalizer import normalize_text
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 def shield_prompt_body(
     user_prompt: str,
     documents: list = None
@@ -56,12 +61,22 @@ def detect_groundness_result(
     response = requests.post(url, headers=headers, json=data)
     return response
 
-async def is_prompt_safe_from_jailbreak(user_prompt: str) -> bool:
+async def is_prompt_safe_from_jailbreak(user_prompt: str, normalized: str = None) -> bool:
     """
     Check if a prompt contains jailbreak attempts using Azure Content Safety API.
     
+    Near-duplicates of prompts the API has already flagged are blocked locally
+    without a round trip; newly flagged prompts are added to that index.
+    
     Returns True if safe, False if jailbreak detected.
     """
+    if normalized is None:
+        normalized = normalize_text(user_prompt)
+    distance = jailbreak_index.match(normalized)
+    if distance is not None:
+        logger.info("shield_prompt_local_match", extra={"fields": {"hamming_distance": distance}})
+        return False
+
     try:
         subscription_key = os.environ["AZURE_CONTENT_SAFETY_KEY"]
         endpoint = os.environ["AZURE_CONTENT_SAFETY_ENDPOINT"]
@@ -77,20 +92,22 @@ async def is_prompt_safe_from_jailbreak(user_prompt: str) -> bool:
         response = detect_groundness_result(data=data, url=url, subscription_key=subscription_key)
         
         if response.status_code != 200:
-            print(f"Jailbreak detection error: {response.status_code}, {response.text}")
+            logger.warning("shield_prompt_http_error", extra={"fields": {"status": response.status_code, "body": response.text[:500]}})
             # On error, default to safe to prevent blocking legitimate queries
             return True
             
         result = response.json()
-        print("shieldPrompt result:", result)
+        attack_detected = result.get("userPromptAnalysis", {}).get("attackDetected", False)
+        logger.info("shield_prompt_result", extra={"fields": {"attack_detected": attack_detected}})
         
         # Check if jailbreak/attack was detected in userPromptAnalysis
-        if result.get("userPromptAnalysis", {}).get("attackDetected", False):
+        if attack_detected:
+            jailbreak_index.add(normalized)
             return False
         
         return True
-    except Exception as e:
-        print(f"Error in jailbreak detection: {str(e)}")
+    except Exception:
+        logger.exception("shield_prompt_error")
         # On error, default to safe to prevent blocking legitimate queries
         return True
 
@@ -0,0 +1,198 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Tuple
+
+# Outbound pacing for Azure OpenAI tokens-per-minute (TPM) and
+# requests-per-minute (RPM) quotas.
+# Every completion reserves its estimated token cost in a sliding one-minute
+# window before it is sent, and the reservation is corrected to the actual
+# `usage.total_tokens` afterwards (for streams, once the stream ends). Callers wait in a priority queue (lower
+# number first, FIFO within a priority) instead of hitting 429s, and a 429
+# that still gets through pauses the whole queue for its `retry-after`.
+
+
+class QuotaWaitTimeout(Exception):
+    """Raised when a request could not be scheduled within `max_queue_wait`."""
+
+
+@dataclass(eq=False)
+class _Reservation:
+    timestamp: float
+    tokens: int
+
+
+def estimate_tokens(messages: List[dict], expected_completion_tokens: int = 0) -> int:
+    """Rough prompt+completion estimate: ~4 characters per token plus per-message overhead."""
+    prompt = sum(len(m.get('content') or '') // 4 + 4 for m in messages)
+    return prompt + expected_completion_tokens
+
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Return the server-requested back-off if `exc` is a throttling (429) error."""
+    if getattr(exc, 'status_code', None) != 429:
+        return None
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    for name, scale in (('retry-after-ms', 0.001), ('retry-after', 1.0)):
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return 1.0
+
+
+class OutboundScheduler:
+    def __init__(
+        self,
+        tokens_per_minute: int,
+        requests_per_minute: int,
+        max_queue_wait: float = 10.0,
+        max_throttle_retries: int = 3,
+        window_seconds: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.max_queue_wait = max_queue_wait
+        self.max_throttle_retries = max_throttle_retries
+        self.window_seconds = window_seconds
+        self._clock = clock
+        self._window: Deque[_Reservation] = deque()
+        self._window_tokens = 0
+        self._queue: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._cond: Optional[asyncio.Condition] = None
+        self.stats = {'sent': 0, 'queued': 0, 'throttled': 0, 'timed_out': 0, 'tokens_actual': 0}
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._window and self._window[0].timestamp <= cutoff:
+            self._window_tokens -= self._window.popleft().tokens
+
+    def _delay(self, entry: Tuple[int, int], tokens: int) -> Optional[float]:
+        """Seconds until `entry` may be sent, 0 if now, None if it must wait its turn."""
+        if self._queue[0] != entry:
+            return None
+        now = self._clock()
+        if self._paused_until > now:
+            return self._paused_until - now
+        self._expire(now)
+        if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+            return self._window[0].timestamp + self.window_seconds - now
+        # An estimate larger than the whole budget is let through once the window is empty.
+        if self.tokens_per_minute and self._window and self._window_tokens + tokens > self.tokens_per_minute:
+            needed = self._window_tokens + tokens - self.tokens_per_minute
+            for r in self._window:
+                needed -= r.tokens
+                if needed <= 0:
+                    return r.timestamp + self.window_seconds - now
+            return self._window[-1].timestamp + self.window_seconds - now
+        return 0.0
+
+    async def _acquire(self, tokens: int, priority: int, deadline: float) -> _Reservation:
+        cond = self._condition()
+        entry = (priority, next(self._seq))
+        async with cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    delay = self._delay(entry, tokens)
+                    if delay is not None and delay <= 0:
+                        break
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        self.stats['timed_out'] += 1
+                        raise QuotaWaitTimeout('outbound quota wait exceeded')
+                    timeout = remaining if delay is None else min(delay, remaining)
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                cond.notify_all()
+            reservation = _Reservation(self._clock(), tokens)
+            self._window.append(reservation)
+            self._window_tokens += tokens
+            return reservation
+
+    def _settle(self, reservation: _Reservation, actual_tokens: Optional[int]):
+        if actual_tokens is None:
+            return
+        self.stats['tokens_actual'] += actual_tokens
+        if reservation in self._window:
+            self._window_tokens += actual_tokens - reservation.tokens
+        reservation.tokens = actual_tokens
+
+    def now(self) -> float:
+        """Current time on this scheduler's clock."""
+        return self._clock()
+
+    def _pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[Any]],
+        estimated_tokens: int,
+        priority: int = 0,
+        usage_of: Callable[[Any], Optional[int]] = lambda result: None,
+        deadline: Optional[float] = None,
+        defer_usage: bool = False,
+    ) -> Any:
+        """Send `call()` once the quota allows it and return its result.
+
+        Throttled attempts are re-queued at the same priority after honouring
+        `retry-after`; other exceptions propagate unchanged. `deadline` (on
+        this scheduler's clock) can only shorten the `max_queue_wait` budget.
+        With `defer_usage` (streams), returns `(result, settle)` instead, and
+        the caller corrects the reservation with `settle(total_tokens)` once
+        usage is known.
+        """
+        own_deadline = self._clock() + self.max_queue_wait
+        deadline = own_deadline if deadline is None else min(deadline, own_deadline)
+        if self._queue:
+            self.stats['queued'] += 1
+        attempts = 0
+        while True:
+            reservation = await self._acquire(estimated_tokens, priority, deadline)
+            try:
+                result = await call()
+            except Exception as e:
+                backoff = retry_after_seconds(e)
+                if backoff is None or attempts >= self.max_throttle_retries:
+                    raise
+                attempts += 1
+                self.stats['throttled'] += 1
+                self._pause(backoff)
+                async with self._condition():
+                    self._condition().notify_all()
+                continue
+            self.stats['sent'] += 1
+            if defer_usage:
+                return result, functools.partial(self._settle, reservation)
+            self._settle(reservation, usage_of(result))
+            return result
+
+    def snapshot(self) -> dict:
+        self._expire(self._clock())
+        return {
+            **self.stats,
+            'queue_depth': len(self._queue),
+            'window_requests': len(self._window),
+            'window_tokens': self._window_tokens,
+            'paused_for': max(0.0, self._paused_until - self._clock()),
+        }
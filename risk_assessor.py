@@ -1,16 +1,19 @@
 from typing import Dict, Any, List
 from interaction_store import get_recent_interactions
+from text_normalizer import normalize_text
 
 # Simple heuristic risk scoring.
 # Factors: repeated blocked attempts, increasing severity categories, presence of self-harm or sexual queries.
 
+# Count user messages containing certain patterns (very naive placeholder).
+# Matched against each interaction's precomputed normalized form.
+BOUNDARY_TERMS = [normalize_text(t) for t in ["bypass", "ignore rules", "jailbreak", "how to harm", "suicide"]]
+
 def assess_risk(session_id: str) -> Dict[str, Any]:
     interactions = get_recent_interactions(session_id, limit=30)
     risk_score = 0
     flags: List[str] = []
 
-    # Count user messages containing certain patterns (very naive placeholder)
-    boundary_terms = ["bypass", "ignore rules", "jailbreak", "how to harm", "suicide"]
     boundary_hits = 0
     sexual_hits = 0
     self_harm_hits = 0
@@ -18,8 +21,8 @@ def assess_risk(session_id: str) -> Dict[str, Any]:
     for inter in interactions:
         if inter.role != 'user':
             continue
-        lower = inter.content.lower()
-        if any(term in lower for term in boundary_terms):
+        normalized = inter.normalized if inter.normalized is not None else normalize_text(inter.content)
+        if any(term in normalized for term in BOUNDARY_TERMS):
             boundary_hits += 1
         if inter.categories:
             if inter.categories.get('sexual', 0) >= 1:
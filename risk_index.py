@@ -0,0 +1,136 @@
+import heapq
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+from interaction_store import add_session_listener
+from risk_assessor import assess_risk
+
+# Live index of sessions by current risk score for /api/mod/sessions/top.
+# An array-backed binary max-heap with a position map (session_id -> index),
+# so a session's score can be raised, lowered or removed in O(log K) where K is
+# the number of sessions with a non-zero score. Reading the top N walks the
+# heap from the root with a small frontier heap: O(N log N), independent of K.
+
+
+@dataclass(eq=False)
+class _Entry:
+    session_id: str
+    risk_score: int
+    risk_level: str
+    flags: List[str] = field(default_factory=list)
+    updated_at: float = 0.0
+
+
+class IndexedMaxHeap:
+    def __init__(self):
+        self._heap: List[_Entry] = []
+        self._pos: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._pos
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i].session_id] = i
+        self._pos[heap[j].session_id] = j
+
+    def _sift_up(self, i: int):
+        heap = self._heap
+        while i > 0:
+            parent = (i - 1) // 2
+            if heap[parent].risk_score >= heap[i].risk_score:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        heap = self._heap
+        n = len(heap)
+        while True:
+            largest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < n and heap[child].risk_score > heap[largest].risk_score:
+                    largest = child
+            if largest == i:
+                return
+            self._swap(i, largest)
+            i = largest
+
+    def upsert(self, entry: _Entry):
+        i = self._pos.get(entry.session_id)
+        if i is None:
+            self._heap.append(entry)
+            i = self._pos[entry.session_id] = len(self._heap) - 1
+            self._sift_up(i)
+            return
+        previous = self._heap[i].risk_score
+        self._heap[i] = entry
+        if entry.risk_score > previous:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def remove(self, session_id: str):
+        i = self._pos.pop(session_id, None)
+        if i is None:
+            return
+        last = self._heap.pop()
+        if i == len(self._heap):
+            return
+        self._heap[i] = last
+        self._pos[last.session_id] = i
+        self._sift_up(i)
+        self._sift_down(self._pos[last.session_id])
+
+    def top(self, n: int) -> List[_Entry]:
+        heap = self._heap
+        result: List[_Entry] = []
+        frontier = [(-heap[0].risk_score, 0)] if heap else []
+        while frontier and len(result) < n:
+            _, i = heapq.heappop(frontier)
+            result.append(heap[i])
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (-heap[child].risk_score, child))
+        return result
+
+
+_index = IndexedMaxHeap()
+
+
+def record_risk(session_id: str, risk: dict):
+    """Update the session's position from an assess_risk result; zero scores leave the index."""
+    if risk['risk_score'] <= 0:
+        _index.remove(session_id)
+        return
+    _index.upsert(_Entry(session_id, risk['risk_score'], risk['risk_level'], list(risk['flags']), time.time()))
+
+
+def top_sessions(n: int) -> List[dict]:
+    return [
+        {
+            'session_id': e.session_id,
+            'risk_score': e.risk_score,
+            'risk_level': e.risk_level,
+            'flags': e.flags,
+            'updated_at': e.updated_at,
+        }
+        for e in _index.top(n)
+    ]
+
+
+def tracked_sessions() -> int:
+    return len(_index)
+
+
+def _on_session_changed(session_id: str):
+    # Evicted or pruned outside a chat turn; rescore what is left (nothing, if dropped)
+    if session_id in _index:
+        record_risk(session_id, assess_risk(session_id))
+
+
+add_session_listener(_on_session_changed)
@@ -0,0 +1,54 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict
+
+# Per-session serialization of chat turns.
+# Turns within one session run one at a time and in arrival order (asyncio.Lock
+# is FIFO). Different sessions never contend. A lock exists only while a turn
+# for its session is running or waiting, so idle sessions cost nothing.
+
+
+@dataclass(eq=False)
+class _SessionLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+_locks: Dict[str, _SessionLock] = {}
+_stats = {'acquired': 0, 'contended': 0, 'wait_ms_total': 0.0, 'max_wait_ms': 0.0, 'max_waiters': 0}
+
+
+@asynccontextmanager
+async def session_lock(session_id: str):
+    entry = _locks.get(session_id)
+    if entry is None:
+        entry = _locks[session_id] = _SessionLock()
+    entry.users += 1
+    contended = entry.lock.locked()
+    if contended:
+        _stats['contended'] += 1
+        _stats['max_waiters'] = max(_stats['max_waiters'], entry.users - 1)
+    started = time.perf_counter()
+    try:
+        async with entry.lock:
+            _stats['acquired'] += 1
+            if contended:
+                waited = (time.perf_counter() - started) * 1000
+                _stats['wait_ms_total'] += waited
+                _stats['max_wait_ms'] = max(_stats['max_wait_ms'], waited)
+            yield
+    finally:
+        entry.users -= 1
+        if entry.users == 0:
+            del _locks[session_id]
+
+
+def lock_stats() -> Dict:
+    return {
+        **_stats,
+        'wait_ms_total': round(_stats['wait_ms_total'], 1),
+        'max_wait_ms': round(_stats['max_wait_ms'], 1),
+        'active_sessions': len(_locks),
+    }
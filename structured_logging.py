@@ -0,0 +1,127 @@
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import zlib
+from typing import Optional
+from config_loader import load_config
+
+# JSON logging that never does I/O on the calling thread.
+# Records go onto a bounded queue through a non-blocking QueueHandler, and a
+# QueueListener thread formats and writes them. When the queue is full the
+# record is dropped and counted, never waited for. Every record carries the
+# current request id. High-volume INFO events can be sampled per request,
+# so a sampled request keeps all of its stages.
+#
+# Usage: logger.info("event_name", extra={"fields": {...}})
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('request_id', default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_traceback_formatter = logging.Formatter()
+_dropped = 0
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp the caller's request id while still on the caller's task."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a configured fraction of selected INFO-or-lower events."""
+
+    def __init__(self, sample_rates: dict):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.sample_rates.get(record.msg)
+        if rate is None or rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            # Same decision for every event of a request
+            return zlib.crc32(request_id.encode()) % 10000 < rate * 10000
+        return random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record: logging.LogRecord):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike the base class, leave formatting to the writer thread: only
+        # resolve args and render the traceback so the record is safe to hand off.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """Route the root logger through the background JSON writer. Idempotent."""
+    global _listener
+    if _listener is not None:
+        return
+    cfg = load_config().get('logging', {})
+    level = os.getenv('LOG_LEVEL', cfg.get('level', 'INFO')).upper()
+    log_file = os.getenv('LOG_FILE', '')
+    target = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler(sys.stdout)
+    target.setFormatter(JsonFormatter())
+
+    log_queue: queue.Queue = queue.Queue(cfg.get('queue_size', 10000))
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(SamplingFilter(cfg.get('sample_rates', {})))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, target, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> dict:
+    return {'dropped_records': _dropped}
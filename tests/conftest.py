@@ -0,0 +1,48 @@
+import os
+import tempfile
+import pytest
+
+# Importing app validates these and builds Azure clients; nothing is contacted in tests
+for _name, _value in {
+    'AZURE_OPENAI_API_KEY': 'test-key',
+    'AZURE_OPENAI_ENDPOINT': 'http://127.0.0.1:9',
+    'AZURE_OPENAI_API_VERSION': '2024-02-15-preview',
+    'AZURE_OPENAI_DEPLOYMENT': 'test-deployment',
+    'AZURE_CONTENT_SAFETY_ENDPOINT': 'http://127.0.0.1:9',
+    'AZURE_CONTENT_SAFETY_KEY': 'test-key',
+    'DATABASE_URL': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'app.db')}",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+
+@pytest.fixture
+def chat_app(monkeypatch):
+    """The FastAPI app module with moderation and LLM calls replaced by local fakes."""
+    from collections import OrderedDict
+    import app
+    import admission_control
+    import interaction_store
+
+    async def content_safe(text):
+        return {'allowed': 'forbidden' not in text, 'categories': {'hate': 0, 'self_harm': 0, 'sexual': 0, 'violence': 0}}
+
+    async def no_jailbreak(text, normalized=None):
+        return True
+
+    async def llm(user_message, age_band='adult', session_id=None):
+        return f"echo: {user_message}"
+
+    async def llm_stream(user_message, age_band='adult', session_id=None):
+        for part in ["Hello there. ", "You said ", user_message]:
+            yield part
+
+    monkeypatch.setattr(app, 'is_content_safe', content_safe)
+    monkeypatch.setattr(app, 'is_prompt_safe_from_jailbreak', no_jailbreak)
+    monkeypatch.setattr(app, 'get_llm_response', llm)
+    monkeypatch.setattr(app, 'stream_llm_response', llm_stream)
+    monkeypatch.setattr(admission_control, '_user_buckets', OrderedDict())
+    monkeypatch.setattr(admission_control, '_session_buckets', OrderedDict())
+    monkeypatch.setattr(interaction_store, '_store', OrderedDict())
+    monkeypatch.setattr(interaction_store, '_session_bytes', {})
+    monkeypatch.setattr(interaction_store, '_total_bytes', 0)
+    return app
@@ -0,0 +1,111 @@
+import asyncio
+from collections import OrderedDict
+import pytest
+import admission_control
+from admission_control import TokenBucket, AdmissionRejected, admission_slot, check_rate, get_admission_metrics
+
+
+def test_token_bucket_burst_then_wait():
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    now = bucket.updated
+    assert bucket.try_take(now) == 0
+    assert bucket.try_take(now) == 0
+    assert bucket.try_take(now) == pytest.approx(1.0)
+    assert bucket.try_take(now + 1.0) == 0
+
+
+def test_session_rate_limit_sheds_with_retry_after():
+    burst = 4  # per_session burst in safety_config.yaml
+    for _ in range(burst):
+        check_rate('rate-user', 'rate-session')
+    with pytest.raises(AdmissionRejected) as exc:
+        check_rate('rate-user', 'rate-session')
+    assert exc.value.retry_after >= 1
+
+
+def test_session_limit_does_not_charge_user_bucket(monkeypatch):
+    monkeypatch.setattr(admission_control, '_user_buckets', OrderedDict())
+    monkeypatch.setattr(admission_control, '_session_buckets', OrderedDict())
+    burst = 4  # per_session burst in safety_config.yaml
+    for _ in range(burst):
+        check_rate('shared-user', 'busy-session')
+    user_tokens = admission_control._user_buckets['shared-user'].tokens
+    for _ in range(3):
+        with pytest.raises(AdmissionRejected):
+            check_rate('shared-user', 'busy-session')
+    assert admission_control._user_buckets['shared-user'].tokens == pytest.approx(user_tokens, abs=0.01)
+
+
+def test_tracked_buckets_are_evicted_least_recently_used(monkeypatch):
+    monkeypatch.setattr(admission_control, '_user_buckets', OrderedDict())
+    monkeypatch.setattr(admission_control, '_session_buckets', OrderedDict())
+    settings = admission_control._settings()
+    monkeypatch.setattr(admission_control, '_settings', lambda: {**settings, 'max_tracked_buckets': 3})
+    for name in ('a', 'b', 'c'):
+        check_rate(f'user-{name}', f'session-{name}')
+    check_rate('user-a', 'session-a')  # a is now the most recently used
+    check_rate('user-d', 'session-d')
+    assert list(admission_control._user_buckets) == ['user-c', 'user-a', 'user-d']
+    assert list(admission_control._session_buckets) == ['session-c', 'session-a', 'session-d']
+
+
+def test_admission_slot_tracks_in_flight():
+    async def scenario():
+        async with admission_slot():
+            assert get_admission_metrics()['in_flight'] == 1
+        return get_admission_metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics['in_flight'] == 0
+    assert metrics['admitted'] >= 1
+
+
+def test_same_session_waiter_does_not_hold_global_slot(chat_app, monkeypatch):
+    import httpx
+    from auth_utils import create_token
+    release = None
+
+    async def slow_llm(user_message, age_band='adult', session_id=None):
+        await release.wait()
+        return f"echo: {user_message}"
+
+    monkeypatch.setattr(chat_app, 'get_llm_response', slow_llm)
+    headers = {'Authorization': f"Bearer {create_token(8, 'kid', 10)}"}
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=chat_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            turns = [
+                asyncio.create_task(client.post('/api/chat', headers=headers,
+                                                json={'message': f'turn {i}', 'session_id': 'slot-session'}))
+                for i in range(2)
+            ]
+            for _ in range(50):
+                await asyncio.sleep(0.01)
+            metrics = get_admission_metrics()
+            release.set()
+            responses = await asyncio.gather(*turns)
+        return metrics, responses
+
+    metrics, responses = asyncio.run(scenario())
+    assert metrics['in_flight'] == 1
+    assert metrics['waiting'] == 0
+    assert [r.status_code for r in responses] == [200, 200]
+
+
+def test_metrics_endpoint_requires_admin(chat_app, monkeypatch):
+    from fastapi.testclient import TestClient
+    import auth_utils
+    from auth_utils import create_token
+
+    monkeypatch.setattr(auth_utils, 'ADMIN_USERNAMES', {'reviewer'})
+    client = TestClient(chat_app.app)
+    assert client.get('/api/mod/metrics').status_code == 401
+    child = {'Authorization': f"Bearer {create_token(60, 'kid', 10)}"}
+    assert client.get('/api/mod/metrics', headers=child).status_code == 403
+    admin = {'Authorization': f"Bearer {create_token(61, 'reviewer', 40)}"}
+    response = client.get('/api/mod/metrics', headers=admin)
+    assert response.status_code == 200
+    assert 'in_flight' in response.json()['admission']
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from alert_broker import subscribe, unsubscribe, replay_since, resume_point
+from escalation_service import trigger_alert
+
+
+def test_subscribers_receive_filtered_alerts_and_replay():
+    async def scenario():
+        sub = subscribe(kinds={'self_harm_interest'}, session_id='broker-s1')
+        try:
+            trigger_alert('high_risk_pattern', 'broker-s1', {})
+            trigger_alert('self_harm_interest', 'broker-s2', {})
+            trigger_alert('self_harm_interest', 'broker-s1', {'n': 1})
+            trigger_alert('self_harm_interest', 'broker-s1', {'n': 2})
+            first = sub.queue.get_nowait()
+            assert first['detail'] == {'n': 1}
+            assert sub.queue.qsize() == 1
+            assert [a['detail'] for a in replay_since(sub, first['id'])] == [{'n': 2}]
+        finally:
+            unsubscribe(sub)
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_is_cut_off_without_blocking_publish():
+    async def scenario():
+        sub = subscribe(session_id='broker-slow')
+        try:
+            for i in range(sub.queue.maxsize + 5):
+                trigger_alert('high_risk_pattern', 'broker-slow', {'i': i})
+            assert sub.overflowed
+            assert sub.queue.full()
+        finally:
+            unsubscribe(sub)
+
+    asyncio.run(scenario())
+
+
+def test_last_event_id_from_another_boot_replays_the_buffer():
+    async def scenario():
+        sub = subscribe(session_id='broker-reboot')
+        try:
+            trigger_alert('self_harm_interest', 'broker-reboot', {'n': 1})
+            alert = sub.queue.get_nowait()
+            # Ids are seeded from the boot time, so an earlier boot's ids are always smaller
+            assert alert['id'] >= (time.time_ns() // 1000) - 60_000_000
+            assert resume_point(alert['id']) == alert['id']
+            for stale in (500, alert['id'] + 10_000):
+                assert resume_point(stale) == 0
+                assert alert in replay_since(sub, resume_point(stale))
+        finally:
+            unsubscribe(sub)
+
+    asyncio.run(scenario())
+
+
+def test_alert_stream_requires_admin(chat_app):
+    from fastapi.testclient import TestClient
+    from auth_utils import create_token
+
+    client = TestClient(chat_app.app)
+    assert client.get('/api/mod/alerts/stream').status_code == 401
+    child = {'Authorization': f"Bearer {create_token(60, 'kid', 10)}"}
+    assert client.get('/api/mod/alerts/stream', headers=child).status_code == 403
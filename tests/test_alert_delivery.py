@@ -0,0 +1,92 @@
+import asyncio
+from aiohttp import web
+from alert_delivery import AlertDispatcher, WebhookSink
+
+
+async def _start_stand_in(fail_first: int):
+    """Local HTTP stand-in for the alert webhook; fails the first N requests."""
+    received = []
+    calls = {'n': 0}
+
+    async def handler(request):
+        calls['n'] += 1
+        if calls['n'] <= fail_first:
+            return web.Response(status=503)
+        received.append((await request.json())['alerts'])
+        return web.Response(status=204)
+
+    app = web.Application()
+    app.router.add_post('/hook', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}/hook', received
+
+
+def test_alerts_are_batched_and_retried_against_webhook():
+    async def scenario():
+        runner, url, received = await _start_stand_in(fail_first=1)
+        dispatcher = AlertDispatcher([WebhookSink(url)], batch_size=3, flush_interval_seconds=0.01,
+                                     backoff_base_seconds=0.01)
+        worker = asyncio.create_task(dispatcher.run())
+        try:
+            await asyncio.sleep(0)
+            for i in range(5):
+                dispatcher.enqueue({'id': i, 'kind': 'self_harm_interest', 'session_id': 's'})
+            for _ in range(200):
+                if dispatcher.stats['delivered'] == 5:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            worker.cancel()
+            await runner.cleanup()
+        return dispatcher, received
+
+    dispatcher, received = asyncio.run(scenario())
+    assert [len(b) for b in received] == [3, 2]
+    assert [a['id'] for b in received for a in b] == [0, 1, 2, 3, 4]
+    assert dispatcher.stats['retries'] == 1
+    assert dispatcher.stats['failed_batches'] == 0
+
+
+def test_enqueue_drops_when_full():
+    dispatcher = AlertDispatcher([], queue_size=2)
+    for i in range(4):
+        dispatcher.enqueue({'id': i})
+    assert dispatcher.snapshot()['queue_depth'] == 2
+    assert dispatcher.stats['dropped'] == 2
+
+
+def test_queued_alerts_are_flushed_at_shutdown_within_a_bound(monkeypatch):
+    import alert_delivery
+
+    class RecordingSink:
+        name = 'recording'
+
+        def __init__(self, hang: bool):
+            self.hang = hang
+            self.received = []
+
+        async def send(self, batch):
+            if self.hang:
+                await asyncio.sleep(60)
+            self.received.extend(batch)
+
+    settings = alert_delivery.delivery_settings()
+    monkeypatch.setattr(alert_delivery, 'delivery_settings', lambda: {**settings, 'shutdown_flush_seconds': 0.1})
+
+    async def scenario(sink):
+        dispatcher = AlertDispatcher([sink], batch_size=2)
+        monkeypatch.setattr(alert_delivery, '_dispatcher', dispatcher)
+        for i in range(3):
+            alert_delivery.enqueue_alert({'id': i, 'kind': 'self_harm_interest', 'session_id': 's'})
+        started = asyncio.get_running_loop().time()
+        await alert_delivery.flush_delivery()
+        return asyncio.get_running_loop().time() - started
+
+    delivering = RecordingSink(hang=False)
+    asyncio.run(scenario(delivering))
+    assert [a['id'] for a in delivering.received] == [0, 1, 2]
+    assert asyncio.run(scenario(RecordingSink(hang=True))) < 1
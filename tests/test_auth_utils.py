@@ -12,3 +12,81 @@ def test_token_encode_decode():
     assert payload
     assert payload['username'] == 'user'
     assert payload['age'] == 15
+
+
+def test_revoked_token_is_rejected_until_it_expires():
+    import time
+    import token_revocation
+    token = create_token(2, 'other', 12)
+    other = create_token(2, 'other', 12)
+    payload = decode_token(token)
+    token_revocation.revoke(payload['jti'], payload['exp'])
+    assert decode_token(token) is None
+    assert decode_token(other)
+    token_revocation.revoke('already-expired', time.time() - 1)
+    assert not token_revocation.is_revoked('already-expired')
+
+
+def test_revocations_are_swept_at_expiry(monkeypatch):
+    import token_revocation
+    now = 1_000_000.0
+    monkeypatch.setattr(token_revocation.time, 'time', lambda: now)
+    token_revocation.revoke('short-lived', now + 10)
+    assert token_revocation.is_revoked('short-lived')
+    now += 11
+    assert not token_revocation.is_revoked('short-lived')
+    assert 'short-lived' not in token_revocation._revoked
+
+
+def test_register_refuses_admin_usernames(chat_app, monkeypatch):
+    from fastapi.testclient import TestClient
+    import auth_utils
+
+    monkeypatch.setattr(auth_utils, 'ADMIN_USERNAMES', {'Reviewer'})
+    client = TestClient(chat_app.app)
+    for name in ('Reviewer', 'reviewer'):
+        response = client.post('/api/auth/register', json={'username': name, 'password': 'secret123', 'age': 40})
+        assert response.status_code == 403
+    response = client.post('/api/auth/register', json={'username': 'reviewer-fan', 'password': 'secret123', 'age': 40})
+    assert response.status_code == 200
+    assert not auth_utils.is_admin(decode_token(response.json()['access_token']))
+
+
+def test_revoke_from_a_thread_while_checking_on_another(monkeypatch):
+    import sys
+    import threading
+    import time
+    import token_revocation
+    monkeypatch.setattr(token_revocation, '_revoked', {})
+    monkeypatch.setattr(token_revocation, '_expiry_heap', [])
+    monkeypatch.setattr(token_revocation, '_bloom', token_revocation.BloomFilter(64, 0.01))
+    monkeypatch.setitem(token_revocation._settings, 'bloom_capacity', 64)  # rebuild often
+    errors = []
+    stop = time.monotonic() + 0.5
+
+    def until_stopped(step):
+        def loop():
+            n = 0
+            try:
+                while time.monotonic() < stop:
+                    n += 1
+                    step(n)
+            except Exception as e:
+                errors.append(e)
+        return threading.Thread(target=loop)
+
+    # Logout runs in the threadpool while chat requests check tokens on the loop
+    threads = [
+        until_stopped(lambda n: token_revocation.revoke(f'race-{n}', time.time() + 0.02)),
+        until_stopped(lambda n: token_revocation.is_revoked('race-check')),
+    ]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert errors == []
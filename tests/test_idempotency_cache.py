@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from idempotency_cache import run_once, IdempotencyConflict
+
+
+def test_concurrent_and_later_retries_share_one_computation():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'response': 'ok'}
+
+    async def scenario():
+        first = await asyncio.gather(*[run_once('user-1', 'key-a', 'fp', compute) for _ in range(3)])
+        later = await run_once('user-1', 'key-a', 'fp', compute)
+        return first, later
+
+    first, later = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert sorted(replayed for _, replayed in first) == [False, True, True]
+    assert later == ({'response': 'ok'}, True)
+
+
+def test_key_reuse_for_other_request_conflicts_and_scopes_per_user():
+    async def compute():
+        return {'response': 'ok'}
+
+    async def scenario():
+        await run_once('user-2', 'key-b', 'fp-1', compute)
+        with pytest.raises(IdempotencyConflict):
+            await run_once('user-2', 'key-b', 'fp-2', compute)
+        return await run_once('user-3', 'key-b', 'fp-2', compute)
+
+    assert asyncio.run(scenario()) == ({'response': 'ok'}, False)
+
+
+def test_failures_are_not_stored():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError('upstream down')
+        return {'response': 'ok'}
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await run_once('user-4', 'key-c', 'fp', flaky)
+        return await run_once('user-4', 'key-c', 'fp', flaky)
+
+    assert asyncio.run(scenario()) == ({'response': 'ok'}, False)
+
+
+def test_rejected_responses_are_shared_but_not_stored():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'response': 'busy', 'llm_error': len(calls) == 1}
+
+    def should_store(response):
+        return not response['llm_error']
+
+    async def scenario():
+        first = await asyncio.gather(*[run_once('user-5', 'key-d', 'fp', compute, should_store) for _ in range(2)])
+        retry = await run_once('user-5', 'key-d', 'fp', compute, should_store)
+        replay = await run_once('user-5', 'key-d', 'fp', compute, should_store)
+        return first, retry, replay
+
+    first, retry, replay = asyncio.run(scenario())
+    assert sorted(replayed for _, replayed in first) == [False, True]
+    assert retry == ({'response': 'busy', 'llm_error': False}, False)
+    assert replay == (retry[0], True)
+    assert len(calls) == 2
+
+
+def test_chat_retry_after_llm_failure_runs_again(chat_app, monkeypatch):
+    from fastapi.testclient import TestClient
+    from auth_utils import create_token
+    from openai_client import LLM_ERROR_MESSAGE
+    replies = iter([LLM_ERROR_MESSAGE, "answer"])
+
+    async def flaky_llm(user_message, age_band='adult', session_id=None):
+        return next(replies)
+
+    monkeypatch.setattr(chat_app, 'get_llm_response', flaky_llm)
+    client = TestClient(chat_app.app)
+    headers = {'Authorization': f"Bearer {create_token(7, 'kid', 10)}", 'Idempotency-Key': 'retry-after-failure'}
+    body = {'message': 'what is a volcano', 'session_id': 'idem-llm'}
+
+    failed = client.post('/api/chat', json=body, headers=headers)
+    retried = client.post('/api/chat', json=body, headers=headers)
+    replayed = client.post('/api/chat', json=body, headers=headers)
+
+    assert failed.json()['llm_error'] is True
+    assert retried.json()['response'].startswith("answer") and 'Idempotent-Replayed' not in retried.headers
+    assert replayed.json() == retried.json() and replayed.headers['Idempotent-Replayed'] == 'true'
@@ -0,0 +1,55 @@
+import json
+import interaction_store
+from interaction_store import add_interaction, get_recent_interactions, list_sessions, store_stats
+
+
+def test_store_evicts_idle_sessions_lru_and_spills(monkeypatch, tmp_path):
+    journal = tmp_path / 'evicted.jsonl'
+    monkeypatch.setenv('INTERACTION_JOURNAL_PATH', str(journal))
+    add_interaction('lru-a', 'user', 'a' * 1000)
+    add_interaction('lru-b', 'user', 'b' * 1000)
+    add_interaction('lru-a', 'user', 'still here')  # a is now more recent than b
+    monkeypatch.setenv('INTERACTION_STORE_MAX_BYTES', str(store_stats()['bytes'] + 500))
+
+    add_interaction('lru-c', 'user', 'c' * 1000)
+
+    assert 'lru-b' not in list_sessions()
+    assert get_recent_interactions('lru-a')
+    assert get_recent_interactions('lru-c')
+    assert store_stats()['bytes'] <= store_stats()['max_bytes']
+    assert interaction_store.flush_journal()
+    spilled = [json.loads(line) for line in journal.read_text().splitlines()]
+    assert [r['session_id'] for r in spilled] == ['lru-b']
+
+
+def test_store_bytes_track_per_session_cap():
+    before = store_stats()['bytes']
+    for i in range(150):
+        add_interaction('cap-session', 'user', f'message {i:03d}')
+    grown = store_stats()['bytes'] - before
+    add_interaction('cap-session', 'user', 'message 150')
+    assert len(get_recent_interactions('cap-session', limit=1000)) == 100
+    assert store_stats()['bytes'] - before == grown
+
+
+def test_retention_prunes_journal_and_follows_path_changes(monkeypatch, tmp_path):
+    first, second = tmp_path / 'first.jsonl', tmp_path / 'second.jsonl'
+    old = {'session_id': 'gone', 'role': 'user', 'content': 'old', 'timestamp': 1.0, 'categories': None, 'normalized': 'old'}
+    first.write_text(json.dumps(old) + '\n')
+    monkeypatch.setenv('INTERACTION_JOURNAL_PATH', str(first))
+    monkeypatch.setattr(interaction_store, '_store', interaction_store.OrderedDict())
+    monkeypatch.setattr(interaction_store, '_session_bytes', {})
+    monkeypatch.setattr(interaction_store, '_total_bytes', 0)
+
+    add_interaction('jr-a', 'user', 'x' * 1000)
+    add_interaction('jr-b', 'user', 'y' * 1000)
+    monkeypatch.setenv('INTERACTION_STORE_MAX_BYTES', '1')
+    add_interaction('jr-c', 'user', 'z')  # evicts jr-a and jr-b into the journal
+    interaction_store.prune_older_than(3600)
+    assert interaction_store.flush_journal()
+    assert [json.loads(line)['session_id'] for line in first.read_text().splitlines()] == ['jr-a', 'jr-b']
+
+    monkeypatch.setenv('INTERACTION_JOURNAL_PATH', str(second))
+    add_interaction('jr-d', 'user', 'w')  # evicts jr-c into the new path
+    assert interaction_store.flush_journal()
+    assert [json.loads(line)['session_id'] for line in second.read_text().splitlines()] == ['jr-c']
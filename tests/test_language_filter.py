@@ -4,3 +4,23 @@ def test_cleanse_output():
     text, modified = cleanse_output("I love you friend")
     assert modified is True
     assert "I love you" not in text
+
+
+def test_obfuscated_phrase_is_replaced_in_place():
+    original = "Step 1: Mix 3 cups of H2O.\nI love\nyou all, and 4th graders too."
+    text, modified, _ = cleanse_output(original)
+    assert modified is True
+    assert text == "Step 1: Mix 3 cups of H2O.\nI'm designed to assist all, and 4th graders too."
+
+
+def test_zero_width_obfuscation_keeps_surrounding_text():
+    text, modified, _ = cleanse_output("Great Job!\nI l\u200bove y0u, Sam. See you at 3.")
+    assert modified is True
+    assert text == "Great Job!\nI'm designed to assist, Sam. See you at 3."
+
+
+def test_plain_and_obfuscated_copies_are_both_replaced():
+    for original in ("I love you! Also I l0ve y0u.", "I love you! Also I love\nyou."):
+        text, modified, _ = cleanse_output(original)
+        assert modified is True
+        assert text == "I'm designed to assist! Also I'm designed to assist."
@@ -0,0 +1,194 @@
+import asyncio
+import time
+from aiohttp import web
+from openai import AsyncAzureOpenAI
+from model_router import Deployment, ModelRouter
+from quota_scheduler import OutboundScheduler, QuotaWaitTimeout
+
+
+async def _start_stub(status: int, reply: str):
+    """Local OpenAI-compatible stand-in for one Azure deployment."""
+    calls = []
+
+    async def handler(request):
+        calls.append(request.match_info['model'])
+        if status != 200:
+            return web.json_response({'error': {'message': 'boom'}}, status=status)
+        return web.json_response({
+            'id': 'c', 'object': 'chat.completion', 'created': 0, 'model': request.match_info['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': reply}}],
+            'usage': {'prompt_tokens': 5, 'completion_tokens': 2, 'total_tokens': 7},
+        })
+
+    app = web.Application()
+    app.router.add_post('/openai/deployments/{model}/chat/completions', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}", calls
+
+
+def _deployment(name: str, endpoint: str) -> Deployment:
+    client = AsyncAzureOpenAI(api_key='k', api_version='2024-02-15-preview', azure_endpoint=endpoint, max_retries=0)
+    return Deployment(name=name, model=f'{name}-model', client=client, scheduler=OutboundScheduler(0, 0))
+
+
+def test_routes_fail_over_and_cool_down_broken_deployment():
+    async def scenario():
+        broken_runner, broken_url, broken_calls = await _start_stub(500, '')
+        good_runner, good_url, good_calls = await _start_stub(200, 'from full')
+        router = ModelRouter(
+            [_deployment('mini', broken_url), _deployment('full', good_url)],
+            routes=[{'age_bands': ['child'], 'max_message_chars': 50, 'deployments': ['mini', 'full']},
+                    {'deployments': ['full']}],
+            max_consecutive_failures=2,
+            cooldown_seconds=60,
+        )
+
+        async def ask(deployment):
+            return await deployment.client.chat.completions.create(
+                model=deployment.model, messages=[{'role': 'user', 'content': 'hi'}])
+
+        try:
+            assert [d.name for d in router.candidates('adult', 10, 0)] == ['full']
+            replies = []
+            for _ in range(3):
+                deployment, response = await router.call(
+                    router.candidates('child', 10, 0), ask, estimated_tokens=10,
+                    usage_of=lambda r: r.usage.total_tokens)
+                replies.append((deployment.name, response.choices[0].message.content))
+        finally:
+            await broken_runner.cleanup()
+            await good_runner.cleanup()
+        return router, replies, broken_calls, good_calls
+
+    router, replies, broken_calls, good_calls = asyncio.run(scenario())
+    assert replies == [('full', 'from full')] * 3
+    assert broken_calls == ['mini-model'] * 2  # skipped once cooled down
+    assert good_calls == ['full-model'] * 3
+    stats = router.snapshot()
+    assert stats['mini']['error_rate'] == 1.0 and stats['mini']['cooling_down_for'] > 0
+    assert stats['full']['p95_ms'] is not None and stats['full']['scheduler']['tokens_actual'] == 21
+    # A cooled-down deployment is still tried last rather than failing outright
+    assert [d.name for d in router.candidates('child', 10, 0)] == ['full', 'mini']
+
+
+def test_balanced_strategy_prefers_faster_less_loaded_deployment():
+    slow, fast = Deployment('slow', 'm', None, OutboundScheduler(0, 0)), Deployment('fast', 'm', None, OutboundScheduler(0, 0))
+    slow.latencies.extend([0.9] * 5)
+    fast.latencies.extend([0.2] * 5)
+    router = ModelRouter([slow, fast], strategy='balanced')
+    assert [d.name for d in router.candidates('teen', 100, 3)] == ['fast', 'slow']
+    fast.in_flight = 9
+    assert [d.name for d in router.candidates('teen', 100, 3)] == ['slow', 'fast']
+
+
+def test_client_errors_are_raised_without_failover_or_cooldown():
+    async def scenario():
+        rejecting_runner, rejecting_url, rejecting_calls = await _start_stub(400, '')
+        good_runner, good_url, good_calls = await _start_stub(200, 'unused')
+        router = ModelRouter([_deployment('mini', rejecting_url), _deployment('full', good_url)],
+                             max_consecutive_failures=1)
+
+        async def ask(deployment):
+            return await deployment.client.chat.completions.create(
+                model=deployment.model, messages=[{'role': 'user', 'content': 'borderline'}])
+
+        errors = []
+        try:
+            for _ in range(3):
+                try:
+                    await router.call(router.candidates('child', 10, 0), ask, estimated_tokens=10)
+                except Exception as e:
+                    errors.append(getattr(e, 'status_code', None))
+        finally:
+            await rejecting_runner.cleanup()
+            await good_runner.cleanup()
+        return router, errors, rejecting_calls, good_calls
+
+    router, errors, rejecting_calls, good_calls = asyncio.run(scenario())
+    assert errors == [400, 400, 400]
+    assert len(rejecting_calls) == 3 and good_calls == []
+    assert router.snapshot()['mini']['failures'] == 0 and router.snapshot()['mini']['cooling_down_for'] == 0
+
+
+def test_queue_wait_budget_is_shared_across_candidates():
+    async def sent(deployment=None):
+        return 'sent'
+
+    async def scenario():
+        busy = [Deployment(name, 'm', None, OutboundScheduler(0, 1, max_queue_wait=0.2)) for name in 'abc']
+        for deployment in busy:
+            await deployment.scheduler.run(sent, estimated_tokens=1)  # spends the 1 RPM
+        router = ModelRouter(busy)
+        started = time.monotonic()
+        try:
+            await router.call(router.candidates('adult', 10, 0), sent, estimated_tokens=1)
+        except QuotaWaitTimeout:
+            return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 0.35  # one shared budget, not 3 x 0.2 s
+
+
+def test_configured_clients_leave_429_retries_to_the_scheduler():
+    from model_router import _deployment_from_config
+    deployment = _deployment_from_config('primary', {}, {'requests_per_minute': 60}, latency_window=10)
+    assert deployment.client.max_retries == 0
+
+
+def test_shared_deadline_follows_the_scheduler_clock():
+    async def sent(deployment=None):
+        return 'sent'
+
+    async def scenario():
+        # A clock far from time.monotonic(); the slot frees up after 0.1 s
+        scheduler = OutboundScheduler(0, 1, window_seconds=0.1, max_queue_wait=2,
+                                      clock=lambda: time.monotonic() + 1e6)
+        deployment = Deployment('skewed', 'm', None, scheduler)
+        await scheduler.run(sent, estimated_tokens=1)
+        router = ModelRouter([deployment])
+        return await router.call(router.candidates('adult', 10, 0), sent, estimated_tokens=1)
+
+    chosen, result = asyncio.run(scenario())
+    assert (chosen.name, result) == ('skewed', 'sent')
+
+
+def test_stream_settles_its_reservation_with_reported_usage(monkeypatch):
+    import json
+    import openai_client
+
+    async def scenario():
+        async def handler(request):
+            body = await request.json()
+            assert body['stream_options'] == {'include_usage': True}
+            response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+            await response.prepare(request)
+            base = {'id': 'c', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'm'}
+            for event in (
+                {**base, 'choices': [{'index': 0, 'delta': {'content': 'Hi there'}, 'finish_reason': None}]},
+                {**base, 'choices': [], 'usage': {'prompt_tokens': 20, 'completion_tokens': 3, 'total_tokens': 23}},
+            ):
+                await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            await response.write(b"data: [DONE]\n\n")
+            return response
+
+        app = web.Application()
+        app.router.add_post('/openai/deployments/{model}/chat/completions', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        try:
+            deployment = _deployment('streamer', f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}")
+            monkeypatch.setattr(openai_client, 'router', ModelRouter([deployment]))
+            monkeypatch.setattr(openai_client, '_outbound_cfg', {'expected_completion_tokens': 400, 'stream_include_usage': True})
+            parts = [part async for part in openai_client.stream_llm_response('hello')]
+            return parts, deployment.scheduler.snapshot()
+        finally:
+            await runner.cleanup()
+
+    parts, snapshot = asyncio.run(scenario())
+    assert parts == ['Hi there']
+    assert snapshot['window_requests'] == 1
+    assert snapshot['window_tokens'] == 23
@@ -0,0 +1,47 @@
+import moderation_stats
+from moderation_stats import _Ring
+
+
+def test_ring_reuses_slots_and_drops_stale_buckets():
+    ring = _Ring(60, 3)
+    ring.add(('messages', 'child'), 0)
+    ring.add(('messages', 'child'), 59)
+    ring.add(('messages', 'child'), 60)
+    assert [(start, counts[('messages', 'child')]) for start, counts in ring.live(60)] == [(0, 2), (60, 1)]
+    ring.add(('messages', 'teen'), 180)  # wraps onto slot 0, resetting it
+    assert [start for start, _ in ring.live(180)] == [60, 180]
+    assert [start for start, _ in ring.live(300)] == [180]
+
+
+def test_rollups_nest_counts_and_compute_block_rates(monkeypatch):
+    monkeypatch.setattr(moderation_stats, '_minutes', _Ring(60, 60))
+    monkeypatch.setattr(moderation_stats, '_hours', _Ring(3600, 24))
+    for _ in range(4):
+        moderation_stats.record('messages', 'child')
+    moderation_stats.record('blocks', 'content_safety', 'child', 'violence')
+    moderation_stats.record('blocks', 'jailbreak', 'child')
+    moderation_stats.record('llm_errors', 'exception')
+
+    rollups = moderation_stats.moderation_rollups()
+    for window in ('per_minute', 'per_hour'):
+        totals = rollups[window]['totals']
+        assert totals['messages'] == {'child': 4}
+        assert totals['blocks'] == {'content_safety': {'child': {'violence': 1}}, 'jailbreak': {'child': 1}}
+        assert totals['llm_errors'] == {'exception': 1}
+        assert totals['block_rate'] == {'child': 0.5}
+
+
+def test_stats_endpoint_requires_admin(chat_app, monkeypatch):
+    from fastapi.testclient import TestClient
+    import auth_utils
+    from auth_utils import create_token
+
+    monkeypatch.setattr(auth_utils, 'ADMIN_USERNAMES', {'reviewer'})
+    client = TestClient(chat_app.app)
+    assert client.get('/api/mod/stats').status_code == 401
+    child = {'Authorization': f"Bearer {create_token(60, 'kid', 10)}"}
+    assert client.get('/api/mod/stats', headers=child).status_code == 403
+    admin = {'Authorization': f"Bearer {create_token(61, 'reviewer', 40)}"}
+    response = client.get('/api/mod/stats', headers=admin)
+    assert response.status_code == 200
+    assert set(response.json()) >= {'per_minute', 'per_hour'}
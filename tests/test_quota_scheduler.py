@@ -0,0 +1,106 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from quota_scheduler import OutboundScheduler, retry_after_seconds
+
+
+class ThrottledError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after_ms: int):
+        super().__init__('429 Too Many Requests')
+        self.response = SimpleNamespace(headers={'retry-after-ms': str(retry_after_ms)})
+
+
+class QuotaStub:
+    """Local stand-in for a deployment that enforces an RPM quota over a short window."""
+
+    def __init__(self, rpm: int, window: float):
+        self.rpm = rpm
+        self.window = window
+        self.accepted = []
+        self.rejected = 0
+
+    async def complete(self, tokens: int):
+        now = time.monotonic()
+        self.accepted = [t for t in self.accepted if t > now - self.window]
+        if len(self.accepted) >= self.rpm:
+            self.rejected += 1
+            raise ThrottledError(retry_after_ms=int(self.window * 1000))
+        self.accepted.append(now)
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=tokens))
+
+
+def test_retry_after_header_parsing():
+    assert retry_after_seconds(ThrottledError(250)) == 0.25
+    assert retry_after_seconds(ValueError('boom')) is None
+
+
+def test_scheduler_paces_within_rpm_without_throttling():
+    # The stub's window is slightly shorter to leave headroom for clock skew.
+    stub = QuotaStub(rpm=3, window=0.18)
+    scheduler = OutboundScheduler(tokens_per_minute=0, requests_per_minute=3, window_seconds=0.2, max_queue_wait=5)
+
+    async def scenario():
+        return await asyncio.gather(*[
+            scheduler.run(lambda: stub.complete(10), estimated_tokens=10, usage_of=lambda r: r.usage.total_tokens)
+            for _ in range(7)
+        ])
+
+    results = asyncio.run(scenario())
+    assert len(results) == 7
+    assert stub.rejected == 0
+    assert scheduler.stats['sent'] == 7
+
+
+def test_scheduler_honours_retry_after_when_quota_is_tighter():
+    stub = QuotaStub(rpm=1, window=0.1)
+    scheduler = OutboundScheduler(tokens_per_minute=0, requests_per_minute=10, window_seconds=0.1, max_queue_wait=5)
+
+    async def scenario():
+        return await asyncio.gather(*[scheduler.run(lambda: stub.complete(5), estimated_tokens=5) for _ in range(3)])
+
+    assert len(asyncio.run(scenario())) == 3
+    assert scheduler.stats['throttled'] >= 1
+
+
+def test_scheduler_serves_higher_priority_first():
+    scheduler = OutboundScheduler(tokens_per_minute=0, requests_per_minute=1, window_seconds=0.05, max_queue_wait=5)
+    order = []
+
+    async def record(name):
+        order.append(name)
+
+    async def scenario():
+        await scheduler.run(lambda: record('first'), estimated_tokens=1)
+        adult = asyncio.create_task(scheduler.run(lambda: record('adult'), estimated_tokens=1, priority=2))
+        await asyncio.sleep(0)
+        child = asyncio.create_task(scheduler.run(lambda: record('child'), estimated_tokens=1, priority=0))
+        await asyncio.gather(adult, child)
+
+    asyncio.run(scenario())
+    assert order == ['first', 'child', 'adult']
+
+
+def test_deferred_usage_corrects_the_reservation_itself():
+    now = [0.0]
+    scheduler = OutboundScheduler(tokens_per_minute=1000, requests_per_minute=4, window_seconds=60,
+                                  max_queue_wait=0.05, clock=lambda: now[0])
+
+    async def open_stream():
+        return 'stream'
+
+    async def scenario():
+        for _ in range(2):
+            stream, settle = await scheduler.run(open_stream, estimated_tokens=100, defer_usage=True)
+            assert stream == 'stream'
+            now[0] += 1
+            settle(60)  # streamed completion came in under the estimate
+        await scheduler.run(open_stream, estimated_tokens=100)
+
+    asyncio.run(scenario())
+    snapshot = scheduler.snapshot()
+    assert snapshot['window_requests'] == 3
+    assert snapshot['window_tokens'] == 220
+    now[0] = 61.5  # both streams leave the window; nothing is left behind for them
+    assert scheduler.snapshot()['window_tokens'] == 100
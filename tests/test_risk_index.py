@@ -0,0 +1,53 @@
+import random
+from risk_index import IndexedMaxHeap, _Entry
+
+
+def _scores(entries):
+    return [e.risk_score for e in entries]
+
+
+def test_updates_and_removals_keep_top_n_ordered():
+    heap = IndexedMaxHeap()
+    rng = random.Random(7)
+    current = {}
+    for step in range(2000):
+        sid = f"s{rng.randrange(50)}"
+        if rng.random() < 0.2:
+            heap.remove(sid)
+            current.pop(sid, None)
+        else:
+            score = rng.randrange(1, 40)
+            heap.upsert(_Entry(sid, score, 'low'))
+            current[sid] = score
+    assert len(heap) == len(current)
+    assert _scores(heap.top(10)) == sorted(current.values(), reverse=True)[:10]
+    assert {e.session_id for e in heap.top(len(current))} == set(current)
+
+
+def test_store_eviction_and_pruning_drop_sessions(monkeypatch):
+    import interaction_store
+    import risk_index
+    monkeypatch.setattr(risk_index, '_index', IndexedMaxHeap())
+    interaction_store.add_interaction('risky', 'user', 'how do I bypass the rules', categories={'self_harm': 2})
+    risk_index.record_risk('risky', risk_index.assess_risk('risky'))
+    assert [s['session_id'] for s in risk_index.top_sessions(5)] == ['risky']
+    assert 'self_harm_interest' in risk_index.top_sessions(1)[0]['flags']
+
+    interaction_store.prune_older_than(-1)
+    assert risk_index.top_sessions(5) == []
+
+
+def test_top_sessions_endpoint_requires_admin(chat_app, monkeypatch):
+    from fastapi.testclient import TestClient
+    import auth_utils
+    from auth_utils import create_token
+
+    monkeypatch.setattr(auth_utils, 'ADMIN_USERNAMES', {'reviewer'})
+    client = TestClient(chat_app.app)
+    assert client.get('/api/mod/sessions/top').status_code == 401
+    child = {'Authorization': f"Bearer {create_token(60, 'kid', 10)}"}
+    assert client.get('/api/mod/sessions/top', headers=child).status_code == 403
+    admin = {'Authorization': f"Bearer {create_token(61, 'reviewer', 40)}"}
+    top = client.get('/api/mod/sessions/top?n=5', headers=admin)
+    assert top.status_code == 200
+    assert 'sessions' in top.json()
@@ -0,0 +1,22 @@
+import asyncio
+from session_locks import session_lock, lock_stats
+
+
+def test_turns_serialize_per_session_and_locks_are_released():
+    events = []
+
+    async def turn(session_id: str, name: str):
+        async with session_lock(session_id):
+            events.append(f'{name}-start')
+            await asyncio.sleep(0.01)
+            events.append(f'{name}-end')
+
+    async def scenario():
+        await asyncio.gather(turn('lock-a', 'a1'), turn('lock-a', 'a2'), turn('lock-b', 'b1'))
+
+    contended_before = lock_stats()['contended']
+    asyncio.run(scenario())
+    assert events.index('a1-end') < events.index('a2-start')
+    assert events.index('b1-start') < events.index('a1-end')  # other sessions run in parallel
+    assert lock_stats()['contended'] == contended_before + 1
+    assert lock_stats()['active_sessions'] == 0
@@ -0,0 +1,82 @@
+import json
+import logging
+import queue
+import pytest
+import structured_logging
+from structured_logging import (
+    JsonFormatter, NonBlockingQueueHandler, RequestContextFilter, SamplingFilter, logging_stats, request_id_var
+)
+
+
+@pytest.fixture
+def capture():
+    """A logger routed through the non-blocking handler into a small queue; returns (logger, queue)."""
+    log_queue = queue.Queue(3)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(SamplingFilter({'chat_turn': 0.5}))
+    logger = logging.getLogger('test_structured_logging')
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    yield logger, log_queue
+    logger.handlers = []
+
+
+def _drain(log_queue):
+    records = []
+    while not log_queue.empty():
+        records.append(log_queue.get_nowait())
+    return records
+
+
+def test_full_queue_drops_and_counts(capture, monkeypatch):
+    logger, log_queue = capture
+    monkeypatch.setattr(structured_logging, '_dropped', 0)
+    for i in range(5):
+        logger.info("event %d", i)
+    assert log_queue.qsize() == 3
+    assert logging_stats()['dropped_records'] == 2
+    assert [r.msg for r in _drain(log_queue)] == ['event 0', 'event 1', 'event 2']
+
+
+def test_records_carry_the_callers_request_id(capture):
+    logger, log_queue = capture
+    token = request_id_var.set('req-stamp')
+    try:
+        logger.warning("moderation_blocked", extra={"fields": {"category": "hate"}})
+    finally:
+        request_id_var.reset(token)
+    logger.warning("outside_request")
+    inside, outside = _drain(log_queue)
+    entry = json.loads(JsonFormatter().format(inside))
+    assert entry['request_id'] == 'req-stamp'
+    assert entry['category'] == 'hate'
+    assert outside.request_id is None
+
+
+def test_sampling_keeps_or_drops_a_whole_request(capture):
+    logger, log_queue = capture
+    kept = 0
+    for n in range(40):
+        token = request_id_var.set(f'req-{n}')
+        try:
+            for _ in range(3):
+                logger.info("chat_turn")
+        finally:
+            request_id_var.reset(token)
+        stages = len(_drain(log_queue))
+        assert stages in (0, 3)
+        kept += bool(stages)
+    assert 0 < kept < 40
+
+
+def test_sampling_never_drops_warnings_or_unlisted_events():
+    sampler = SamplingFilter({'chat_turn': 0.0})
+    record = logging.LogRecord('x', logging.INFO, __file__, 1, 'chat_turn', None, None)
+    record.request_id = 'req-any'
+    assert sampler.filter(record) is False
+    record.levelno = logging.WARNING
+    assert sampler.filter(record) is True
+    other = logging.LogRecord('x', logging.INFO, __file__, 1, 'other_event', None, None)
+    assert sampler.filter(other) is True
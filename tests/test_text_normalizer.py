@@ -0,0 +1,12 @@
+from text_normalizer import normalize_text
+
+
+def test_normalize_folds_common_evasions():
+    assert normalize_text('Ｉｇｎｏｒｅ  ＲＵＬＥＳ') == 'ignore rules'
+    assert normalize_text('by\u200bp\u00adass') == 'bypass'
+    assert normalize_text('јаіlbrеаk') == 'jailbreak'
+    assert normalize_text('h0w t0 h4rm') == 'how to harm'
+
+
+def test_normalize_keeps_plain_numbers():
+    assert normalize_text('I am 12 and have 3 cats') == 'i am 12 and have 3 cats'
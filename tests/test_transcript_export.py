@@ -0,0 +1,73 @@
+import gzip
+import json
+import interaction_store
+from interaction_store import add_interaction
+from transcript_export import iter_records, ndjson_chunks
+
+
+def test_export_merges_journal_and_memory_with_filters(tmp_path):
+    journal = tmp_path / 'evicted.jsonl'
+    journal.write_text(
+        json.dumps({'session_id': 'exp-old', 'role': 'user', 'content': 'evicted', 'timestamp': 10.0,
+                    'categories': None, 'normalized': 'evicted'}) + '\n'
+        + '{"session_id": "exp-old", "role": "bot", "cont'  # torn line being appended
+    )
+    add_interaction('exp-live', 'user', 'still in memory')
+    add_interaction('exp-other', 'user', 'not selected')
+
+    records = list(iter_records(session_ids={'exp-old', 'exp-live'}, journal=str(journal)))
+    assert [(r['session_id'], r['content'], r['source']) for r in records] == [
+        ('exp-old', 'evicted', 'journal'), ('exp-live', 'still in memory', 'memory')
+    ]
+    assert 'normalized' not in records[0]
+    recent = list(iter_records(since=11, session_ids={'exp-old', 'exp-live'}, journal=str(journal)))
+    assert [r['session_id'] for r in recent] == ['exp-live']
+
+
+def test_gzip_stream_round_trips_across_chunks():
+    records = [{'session_id': f's{i}', 'content': 'x' * 500} for i in range(500)]
+    chunks = list(ndjson_chunks(iter(records), compress=True))
+    assert len(chunks) > 1
+    lines = gzip.decompress(b''.join(chunks)).decode('utf-8').splitlines()
+    assert [json.loads(line) for line in lines] == records
+
+
+def test_sessions_dropped_mid_export_are_skipped():
+    add_interaction('exp-a', 'user', 'one')
+    add_interaction('exp-b', 'user', 'two')
+    sessions = interaction_store.iter_sessions()
+    seen = []
+    for session_id, _ in sessions:
+        seen.append(session_id)
+        if session_id == 'exp-a':
+            interaction_store._drop_session('exp-b')
+    assert 'exp-a' in seen and 'exp-b' not in seen
+
+
+def test_admin_export_runs_the_scan_off_the_event_loop(chat_app, monkeypatch):
+    import threading
+    from fastapi.testclient import TestClient
+    import auth_utils
+    from auth_utils import create_token
+    threads = {}
+
+    def tracked_records(**filters):
+        threads['endpoint'] = threading.get_ident()  # called inside the endpoint coroutine
+
+        def generate():
+            threads['scan'] = threading.get_ident()
+            yield from iter_records(**filters)
+        return generate()
+
+    monkeypatch.setattr(auth_utils, 'ADMIN_USERNAMES', {'reviewer'})
+    monkeypatch.setattr(chat_app, 'iter_records', tracked_records)
+    add_interaction('exp-thread', 'user', 'hello')
+    client = TestClient(chat_app.app)
+    admin = {'Authorization': f"Bearer {create_token(50, 'reviewer', 40)}"}
+
+    response = client.get('/api/admin/export?session_id=exp-thread&gzip=true', headers=admin)
+    assert response.status_code == 200
+    lines = gzip.decompress(response.content).decode('utf-8').splitlines()
+    assert [json.loads(line)['content'] for line in lines] == ['hello']
+    assert threads['scan'] != threads['endpoint']
+    assert client.get('/api/admin/export', headers={'Authorization': f"Bearer {create_token(51, 'kid', 10)}"}).status_code == 403
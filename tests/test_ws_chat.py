@@ -0,0 +1,114 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from auth_utils import create_token
+import ws_connections
+from ws_connections import ChatConnection
+
+
+def _client(chat_app):
+    return TestClient(chat_app.app)
+
+
+def test_rejects_missing_or_invalid_token(chat_app):
+    client = _client(chat_app)
+    with client.websocket_connect('/ws/chat?token=not-a-jwt') as ws:
+        assert ws.receive_json() == {'type': 'error', 'reason': 'invalid_token'}
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 4401
+
+    with client.websocket_connect('/ws/chat') as ws:
+        ws.send_json(['not', 'an', 'auth', 'frame'])
+        assert ws.receive_json()['reason'] == 'invalid_token'
+
+
+def test_auth_frame_and_age_gate(chat_app):
+    client = _client(chat_app)
+    with client.websocket_connect('/ws/chat?session_id=ws-auth') as ws:
+        ws.send_json({'type': 'auth', 'token': create_token(1, 'teen', 15)})
+        assert ws.receive_json() == {'type': 'ready', 'session_id': 'ws-auth', 'age_band': 'teen'}
+
+    with client.websocket_connect(f"/ws/chat?token={create_token(2, 'tiny', 4)}") as ws:
+        assert ws.receive_json()['reason'] == 'age_gate'
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 4403
+
+
+def test_streams_deltas_then_done_and_survives_bad_frames(chat_app):
+    client = _client(chat_app)
+    with client.websocket_connect(f"/ws/chat?token={create_token(3, 'kid', 10)}&session_id=ws-stream") as ws:
+        assert ws.receive_json()['type'] == 'ready'
+        ws.send_bytes(b'\x00')
+        assert ws.receive_json() == {'type': 'error', 'reason': 'invalid_frame'}
+        ws.send_text('not json')
+        assert ws.receive_json() == {'type': 'error', 'reason': 'invalid_frame'}
+        ws.send_json({'type': 'message', 'message': '   '})
+        assert ws.receive_json() == {'type': 'error', 'reason': 'invalid_message'}
+        ws.send_json({'type': 'ping'})
+        assert ws.receive_json() == {'type': 'pong'}
+
+        ws.send_json({'type': 'message', 'message': 'hi'})
+        assert ws.receive_json() == {'type': 'delta', 'text': 'Hello there. '}
+        assert ws.receive_json() == {'type': 'delta', 'text': 'You said hi'}
+        done = ws.receive_json()
+        assert done['type'] == 'done' and done['response'] == 'Hello there. You said hi'
+        assert done['session_id'] == 'ws-stream' and done['llm_error'] is False
+
+        ws.send_json({'type': 'message', 'message': 'something forbidden'})
+        moderation = ws.receive_json()
+        assert moderation['type'] == 'moderation' and moderation['reason'] == 'content_safety_block'
+        assert ws.receive_json()['type'] == 'done'
+
+
+class _FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send_json(self, event):
+        self.sent.append(event)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_heartbeat_pings_active_and_closes_idle_connections(monkeypatch):
+    settings = {**ws_connections.ws_settings(), 'heartbeat_interval_seconds': 0.01, 'idle_timeout_seconds': 60}
+    monkeypatch.setattr(ws_connections, 'ws_settings', lambda: settings)
+    monkeypatch.setattr(ws_connections, '_connections', set())
+
+    async def scenario():
+        active = ChatConnection(_FakeSocket(), 'u1', 's1', 'child')
+        idle = ChatConnection(_FakeSocket(), 'u2', 's2', 'child', last_seen=time.monotonic() - 120)
+        busy = ChatConnection(_FakeSocket(), 'u3', 's3', 'child', last_seen=time.monotonic() - 120, busy=True)
+        for conn in (active, idle, busy):
+            ws_connections.register(conn)
+        sweep = asyncio.create_task(ws_connections.heartbeat_loop())
+        await asyncio.sleep(0.03)
+        sweep.cancel()
+        return active, idle, busy
+
+    active, idle, busy = asyncio.run(scenario())
+    assert {'type': 'ping'} in active.websocket.sent and active.websocket.closed_with is None
+    assert idle.websocket.closed_with == 1001 and idle not in ws_connections._connections
+    assert busy.websocket.sent == [] and busy.websocket.closed_with is None
+
+
+def test_logout_ends_an_open_socket_at_the_next_message(chat_app):
+    from auth_utils import decode_token
+    from token_revocation import revoke
+    client = _client(chat_app)
+    token = create_token(9, 'kid', 10)
+    with client.websocket_connect(f"/ws/chat?token={token}&session_id=ws-revoked") as ws:
+        assert ws.receive_json()['type'] == 'ready'
+        payload = decode_token(token)
+        revoke(payload['jti'], payload['exp'])
+        ws.send_json({'type': 'message', 'message': 'still there?'})
+        assert ws.receive_json() == {'type': 'error', 'reason': 'invalid_token'}
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 4401
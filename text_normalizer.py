@@ -0,0 +1,110 @@
+import re
+import unicodedata
+
+# Canonical matching form of a message, computed once per message and reused
+# by every matcher (risk terms, output filter) and cache key.
+# Steps: NFKC (folds full-width and compatibility forms), casefold, strip
+# zero-width/format characters, fold common Cyrillic/Greek look-alikes to
+# Latin, undo leetspeak digits/symbols written inside words, collapse
+# whitespace. The result is for matching only and is never shown to users.
+
+_ZERO_WIDTH = '\u00ad\u180e\u200b\u200c\u200d\u200e\u200f\u2060\u2061\u2062\u2063\u2064\ufeff'
+
+# Lowercase only: applied after casefold()
+_CONFUSABLES = {
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p',
+    'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'і': 'i', 'ї': 'i', 'ј': 'j', 'ѕ': 's', 'ԁ': 'd',
+    'һ': 'h', 'ԛ': 'q', 'ԝ': 'w',
+    # Greek
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+    # Latin extensions that NFKC leaves alone
+    'ı': 'i', 'ɡ': 'g', 'ʀ': 'r', 'ᴀ': 'a', 'ᴇ': 'e', 'ᴏ': 'o',
+}
+
+_TRANSLATION = str.maketrans({**dict.fromkeys(_ZERO_WIDTH, None), **_CONFUSABLES})
+
+_LEET = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'})
+_LEET_RE = re.compile(r'[013457@$]+')
+
+
+def _unleet(match: re.Match) -> str:
+    # Only substitute next to a letter, so plain numbers ("I am 12") stay as they are
+    text, (start, end) = match.string, match.span()
+    if (start and text[start - 1].isalpha()) or (end < len(text) and text[end].isalpha()):
+        return match.group().translate(_LEET)
+    return match.group()
+
+
+def normalize_text(text: str) -> str:
+    if text.isascii():
+        # Fast path: NFKC and the translation table are no-ops on ASCII
+        folded = text.lower()
+    else:
+        folded = unicodedata.normalize('NFKC', text).casefold().translate(_TRANSLATION)
+    folded = _LEET_RE.sub(_unleet, folded)
+    return ' '.join(folded.split())
+
+
+def normalize_with_offsets(text: str) -> tuple[str, list[int]]:
+    """Matching form plus, for each of its characters, the index in `text` it came from.
+
+    Folds character by character, so a match in the normalized form can be
+    mapped back to a span of the original text. Slower than normalize_text;
+    meant for the rare case where a match has to be located in the original.
+    """
+    chars: list[str] = []
+    origins: list[int] = []
+    plain = text.isascii()
+    for i, ch in enumerate(text):
+        folded = ch.lower() if plain else unicodedata.normalize('NFKC', ch).casefold().translate(_TRANSLATION)
+        chars.extend(folded)
+        origins.extend([i] * len(folded))
+    folded = _LEET_RE.sub(_unleet, ''.join(chars))  # one-for-one, offsets unchanged
+
+    out: list[str] = []
+    out_origins: list[int] = []
+    space_origin = None
+    for ch, origin in zip(folded, origins):
+        if ch.isspace():
+            if out and space_origin is None:
+                space_origin = origin
+            continue
+        if space_origin is not None:
+            out.append(' ')
+            out_origins.append(space_origin)
+            space_origin = None
+        out.append(ch)
+        out_origins.append(origin)
+    return ''.join(out), out_origins
+
+
+if __name__ == "__main__":
+    # Throughput benchmark: python text_normalizer.py [messages]
+    import random
+    import sys
+    import time
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(0)
+    plain = ["please", "help", "me", "with", "my", "homework", "about", "volcanoes", "why", "is",
+             "the", "sky", "blue", "I", "am", "12", "years", "old", "can", "you", "explain", "fractions?"]
+    evasive = ["h0w", "t0", "h4rm", "ｂｙｐａｓｓ", "јаіlbrеаk", "fri\u200bend", "1gn0re", "ＲＵＬＥＳ"]
+
+    def make_corpus(evasive_share: float) -> list:
+        return [
+            " ".join(rng.choice(evasive if rng.random() < evasive_share else plain) for _ in range(rng.randint(5, 60)))
+            for _ in range(count)
+        ]
+
+    for corpus_label, corpus in (("typical (2% evasive words)", make_corpus(0.02)),
+                                 ("adversarial (30% evasive words)", make_corpus(0.30))):
+        total_bytes = sum(len(c.encode('utf-8')) for c in corpus)
+        print(f"{corpus_label}: {count:,} messages, {total_bytes / 1e6:.1f} MB")
+        for label, fn in (("str.lower baseline", str.lower), ("normalize_text", normalize_text)):
+            start = time.perf_counter()
+            for message in corpus:
+                fn(message)
+            elapsed = time.perf_counter() - start
+            print(f"  {label:20s} {count / elapsed:12,.0f} msg/s {total_bytes / elapsed / 1e6:8.1f} MB/s")
@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Tuple
+from config_loader import load_config
+
+logger = logging.getLogger(__name__)
+
+# Revocation list for JWTs, keyed by the `jti` claim.
+# Revoked ids live in a dict (jti -> exp) with a min-heap on exp, so entries are
+# dropped as soon as the token would have expired anyway. A Bloom filter in
+# front answers the common "not revoked" case without touching the dict; it is
+# rebuilt once sweeping has removed enough entries to make it stale. With
+# `shared` enabled, revocations are also written to the revoked_tokens table
+# and every worker pulls new rows on a short interval.
+# Sync endpoints (logout, /me) revoke and check from threadpool threads while
+# async ones check on the event loop, so the structures are only touched
+# under `_lock`; database I/O stays outside it.
+
+
+def revocation_settings() -> dict:
+    cfg = load_config().get('token_revocation', {})
+    shared = os.getenv('TOKEN_REVOCATION_SHARED')
+    return {
+        'shared': shared.lower() == 'true' if shared is not None else cfg.get('shared', False),
+        'sync_interval_seconds': cfg.get('sync_interval_seconds', 5),
+        'bloom_capacity': cfg.get('bloom_capacity', 100_000),
+        'bloom_error_rate': cfg.get('bloom_error_rate', 0.01),
+    }
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+_settings = revocation_settings()
+_revoked: Dict[str, float] = {}
+_expiry_heap: List[Tuple[float, str]] = []
+_bloom = BloomFilter(_settings['bloom_capacity'], _settings['bloom_error_rate'])
+_removed_since_rebuild = 0
+_last_synced_id = 0
+_lock = threading.Lock()
+_stats = {'revoked': 0, 'checks': 0, 'bloom_negatives': 0, 'hits': 0, 'expired': 0, 'rebuilds': 0, 'synced': 0}
+
+
+def _rebuild_bloom():
+    global _bloom, _removed_since_rebuild
+    _bloom = BloomFilter(max(_settings['bloom_capacity'], 2 * len(_revoked)), _settings['bloom_error_rate'])
+    for jti in _revoked:
+        _bloom.add(jti)
+    _removed_since_rebuild = 0
+    _stats['rebuilds'] += 1
+
+
+def _sweep(now: float):
+    global _removed_since_rebuild
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        exp, jti = heapq.heappop(_expiry_heap)
+        if _revoked.get(jti) == exp:
+            del _revoked[jti]
+            _removed_since_rebuild += 1
+            _stats['expired'] += 1
+    if _removed_since_rebuild > max(len(_revoked), 1024):
+        _rebuild_bloom()
+
+
+def _remember(jti: str, exp: float) -> bool:
+    if exp <= time.time() or _revoked.get(jti, 0) >= exp:
+        return False
+    _revoked[jti] = exp
+    heapq.heappush(_expiry_heap, (exp, jti))
+    _bloom.add(jti)
+    if len(_revoked) > _bloom.capacity:
+        _rebuild_bloom()
+    return True
+
+
+def revoke(jti: str, exp: float):
+    """Revoke a token id until `exp` (epoch seconds)."""
+    with _lock:
+        remembered = _remember(jti, float(exp))
+    if not remembered:
+        return
+    _stats['revoked'] += 1
+    if _settings['shared']:
+        _persist(jti, float(exp))
+
+
+def is_revoked(jti: str) -> bool:
+    with _lock:
+        _stats['checks'] += 1
+        _sweep(time.time())
+        if jti not in _bloom:
+            _stats['bloom_negatives'] += 1
+            return False
+        if jti in _revoked:
+            _stats['hits'] += 1
+            return True
+        return False
+
+
+def _persist(jti: str, exp: float):
+    from database import SessionLocal
+    from models import RevokedToken
+    db = SessionLocal()
+    try:
+        db.add(RevokedToken(jti=jti, expires_at=exp))
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("token_revocation_persist_error")
+    finally:
+        db.close()
+
+
+def _pull_new_rows() -> List[Tuple[int, str, float]]:
+    from database import SessionLocal
+    from models import RevokedToken
+    now = time.time()
+    db = SessionLocal()
+    try:
+        db.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete()
+        db.commit()
+        rows = (db.query(RevokedToken)
+                .filter(RevokedToken.id > _last_synced_id)
+                .order_by(RevokedToken.id)
+                .all())
+        return [(row.id, row.jti, row.expires_at) for row in rows]
+    finally:
+        db.close()
+
+
+async def revocation_sync_loop():
+    """Merge revocations made by other workers. No-op unless `shared` is enabled."""
+    global _last_synced_id
+    if not _settings['shared']:
+        return
+    while True:
+        try:
+            for row_id, jti, exp in await asyncio.to_thread(_pull_new_rows):
+                _last_synced_id = max(_last_synced_id, row_id)
+                with _lock:
+                    remembered = _remember(jti, exp)
+                if remembered:
+                    _stats['synced'] += 1
+        except Exception:
+            logger.exception("token_revocation_sync_error")
+        await asyncio.sleep(_settings['sync_interval_seconds'])
+
+
+def revocation_stats() -> dict:
+    return {**_stats, 'active': len(_revoked), 'shared': _settings['shared']}
@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import sys
+import zlib
+from typing import Collection, Iterable, Iterator, Optional
+from interaction_store import iter_sessions, journal_path
+
+# Bulk transcript export for safeguarding reviews.
+# Records come from the spill journal (sessions evicted from memory) and then
+# the live in-memory store, one interaction per NDJSON line. Everything is a
+# generator: the journal is read line by line and the store is walked over a
+# snapshot of its session ids, so memory use does not grow with the data.
+# Gzip is applied on the fly with a streaming zlib compressor. The server
+# hands the sync generator to StreamingResponse, which drives it from the
+# threadpool, so scanning and filtering a large journal never runs on the
+# event loop. The store snapshot and per-session copies are single C-level
+# list() calls, so reading them from that thread is safe.
+
+_FIELDS = ('role', 'content', 'timestamp', 'categories')
+_CHUNK_BYTES = 64 * 1024
+
+
+def _keep(record: dict, since: Optional[float], until: Optional[float], session_ids: Optional[Collection[str]]) -> bool:
+    if session_ids is not None and record['session_id'] not in session_ids:
+        return False
+    if since is not None and record['timestamp'] < since:
+        return False
+    if until is not None and record['timestamp'] >= until:
+        return False
+    return True
+
+
+def _journal_records(path: str) -> Iterator[dict]:
+    if not path or not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # torn last line while the server is appending
+            yield {'session_id': row['session_id'], **{k: row.get(k) for k in _FIELDS}, 'source': 'journal'}
+
+
+def _memory_records() -> Iterator[dict]:
+    for session_id, interactions in iter_sessions():
+        for i in interactions:
+            yield {'session_id': session_id, **{k: getattr(i, k) for k in _FIELDS}, 'source': 'memory'}
+
+
+def iter_records(
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    session_ids: Optional[Collection[str]] = None,
+    journal: Optional[str] = None,
+    include_memory: bool = True
+) -> Iterator[dict]:
+    """Interactions from the journal (default: the configured one), then from memory."""
+    sources = [_journal_records(journal_path() if journal is None else journal)]
+    if include_memory:
+        sources.append(_memory_records())
+    for source in sources:
+        for record in source:
+            if _keep(record, since, until, session_ids):
+                yield record
+
+
+def ndjson_chunks(records: Iterable[dict], compress: bool = False) -> Iterator[bytes]:
+    """Encode records as NDJSON, batched into ~64 KiB chunks and optionally gzipped."""
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip container
+    pending = []
+    size = 0
+    for record in records:
+        line = (json.dumps(record, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+        pending.append(line)
+        size += len(line)
+        if size >= _CHUNK_BYTES:
+            data = b''.join(pending)
+            pending, size = [], 0
+            data = gzip.compress(data) if gzip else data
+            if data:
+                yield data
+    tail = b''.join(pending)
+    if gzip:
+        tail = gzip.compress(tail) + gzip.flush()
+    if tail:
+        yield tail
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Export transcripts as NDJSON. A standalone process only sees persisted "
+                    "data (the spill journal); use GET /api/admin/export for the live store."
+    )
+    parser.add_argument('--journal', default=None, help="journal path (default: INTERACTION_JOURNAL_PATH / config)")
+    parser.add_argument('--since', type=float, help="epoch seconds, inclusive")
+    parser.add_argument('--until', type=float, help="epoch seconds, exclusive")
+    parser.add_argument('--session-id', action='append', dest='session_ids', help="repeatable")
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('-o', '--output', default='-', help="file path, or - for stdout")
+    args = parser.parse_args(argv)
+
+    records = iter_records(
+        since=args.since,
+        until=args.until,
+        session_ids=set(args.session_ids) if args.session_ids else None,
+        journal=args.journal
+    )
+    out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for chunk in ndjson_chunks(records, compress=args.gzip):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
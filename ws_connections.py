@@ -0,0 +1,101 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Set
+from fastapi import WebSocket
+from config_loader import load_config
+
+# Registry of open /ws/chat connections.
+# Auth, session id and age band are resolved once at connect time and kept on
+# the connection; only the token's revocation is re-checked, before each message. A single heartbeat task serves every connection (no per-socket
+# timers), so an idle child session costs one receive coroutine and this object.
+
+
+def ws_settings() -> dict:
+    cfg = load_config().get('websocket', {})
+    return {
+        'heartbeat_interval_seconds': cfg.get('heartbeat_interval_seconds', 25),
+        'idle_timeout_seconds': cfg.get('idle_timeout_seconds', 300),
+        'send_timeout_seconds': cfg.get('send_timeout_seconds', 10),
+        'auth_timeout_seconds': cfg.get('auth_timeout_seconds', 10),
+        'max_message_chars': cfg.get('max_message_chars', 4000),
+    }
+
+
+class SlowConsumer(Exception):
+    """Raised when a client does not drain its socket within the send timeout."""
+
+
+@dataclass(eq=False)
+class ChatConnection:
+    websocket: WebSocket
+    user_id: str
+    session_id: str
+    age_band: str
+    jti: Optional[str] = None
+    last_seen: float = field(default_factory=time.monotonic)
+    busy: bool = False
+    _send_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    async def send(self, event: dict):
+        """Send one JSON event. Awaiting the send is the backpressure: a streaming
+        turn only produces as fast as the client reads, and a client that stalls
+        past `send_timeout_seconds` is dropped instead of buffering without bound.
+        """
+        timeout = ws_settings()['send_timeout_seconds']
+        async with self._send_lock:
+            try:
+                await asyncio.wait_for(self.websocket.send_json(event), timeout)
+            except asyncio.TimeoutError:
+                raise SlowConsumer(self.session_id)
+
+    async def close(self, code: int = 1000):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+_connections: Set[ChatConnection] = set()
+
+
+def register(conn: ChatConnection):
+    _connections.add(conn)
+
+
+def unregister(conn: ChatConnection):
+    _connections.discard(conn)
+
+
+def connection_count() -> int:
+    return len(_connections)
+
+
+async def heartbeat_loop():
+    while True:
+        settings = ws_settings()
+        await asyncio.sleep(settings['heartbeat_interval_seconds'])
+        now = time.monotonic()
+        pings = []
+        for conn in list(_connections):
+            if conn.busy:
+                # Mid-turn sockets are already carrying traffic.
+                continue
+            if now - conn.last_seen > settings['idle_timeout_seconds']:
+                unregister(conn)
+                await conn.close(code=1001)
+            else:
+                pings.append(_ping(conn))
+        # Concurrently, so one stalled client cannot hold up the sweep
+        await asyncio.gather(*pings)
+
+
+async def _ping(conn: ChatConnection):
+    try:
+        await conn.send({'type': 'ping'})
+    except Exception:
+        unregister(conn)
+        await conn.close(code=1011)